@@ -1,97 +1,52 @@
 import streamlit as st
-import sqlite3
 import bcrypt
-import pandas as pd
 import plotly.express as px
-from PIL import Image
-import base64
-import io
+import sqlite3
 from datetime import datetime
-from prophet import Prophet
+from dataclasses import replace
 import streamlit.components.v1 as components
-import hashlib
-from io import BytesIO
+
+from database import connection, transaction, initialize_db
+import queries
+import cache
+import assets
+import images
+import receipts
+import forecasting
+import forecast_jobs
+import formatting
+import importer
+import exporter
+import user_profile
+import dates
 
 st.set_page_config(
     page_title="Xpense",
     layout="wide",
-    page_icon="Xpense V5.png"
+    page_icon=assets.logo_image(assets.LOGO_SIZE_CORNER)
 )
 
-# --- Database Connection ---
-DB_NAME = "users.db"
-
-def get_connection():
-    return sqlite3.connect(DB_NAME)
-
-def initialize_db():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        username TEXT PRIMARY KEY,
-        password_hash TEXT NOT NULL,
-        role TEXT DEFAULT 'user',
-        profile_pic BLOB,
-        emergency_rate INTEGER DEFAULT 10,
-        nama_akun TEXT
-    )
-    """)
-
-    try:
-        cursor.execute("ALTER TABLE users ADD COLUMN nama_akun TEXT")
-    except sqlite3.OperationalError:
-        # Jika kolom sudah ada, abaikan error
-        pass
-        
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS laporan_keuangan (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT,
-        tanggal TEXT,
-        kategori TEXT,
-        jenis TEXT,
-        jumlah INTEGER,
-        dana_darurat INTEGER,
-        keterangan TEXT,
-        bukti_img BLOB
-    )
-    """)
-
-    # --- Inisialisasi Tabel Target Jika Belum Ada ---
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS target_anggaran (
-            username TEXT,
-            bulan TEXT,
-            tahun INTEGER,
-            target_pengeluaran INTEGER,
-            target_tabungan INTEGER,
-            target_investasi INTEGER,
-            PRIMARY KEY (username, bulan, tahun)
-        )
-    """)
-    conn.commit()
-    conn.close()
-
 def tampilkan_logo_kiri_atas():
-    logo_base64 = base64.b64encode(open("Xpense V5.png", "rb").read()).decode()
     st.markdown(
         f"""
         <div style='position: fixed; top: 15px; left: 15px; z-index: 9999;'>
-            <img src='data:image/png;base64,{logo_base64}' width='40' style='border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.2);'>
+            <img src='{assets.logo_data_uri(assets.LOGO_SIZE_CORNER)}' width='40' style='border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.2);'>
         </div>
         """,
         unsafe_allow_html=True
     )
 
 
-def get_user_settings(username):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT emergency_rate, profile_pic FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    conn.close()
-    return result
+def avatar_uri(user_id, content_hash, size):
+    # Data URI cached per content hash; the thumbnail BLOB is only read on a cache miss
+    column = "profile_pic_small" if size == images.AVATAR_SIZE_SMALL else "profile_pic"
+
+    def load():
+        with connection() as conn:
+            row = conn.execute(f"SELECT {column} FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    return images.avatar_data_uri(content_hash, size, load)
 
 
 # --- Login / Register Page ---
@@ -99,13 +54,11 @@ def login_register_page():
     col1, col2, col3 = st.columns([2, 6, 2])
 
     with col2:
-        logo_base64 = base64.b64encode(open("Xpense V5.png", "rb").read()).decode()
-
         with st.container():
             st.markdown(
                 f"""
                 <div style='display: flex; justify-content: center; align-items: center; flex-direction: column;'>
-                    <img src='data:image/png;base64,{logo_base64}' width='150' style='margin-bottom: 20px;'/>
+                    <img src='{assets.logo_data_uri(assets.LOGO_SIZE_LOGIN)}' width='150' style='margin-bottom: 20px;'/>
                     <h1 style='text-align: center; margin-bottom: 0; color: #4CAF50;'>Selamat Datang di Aplikasi Xpense</span></h1>
                     <p style='text-align: center; font-size: 18px; margin-top: 0;'>Kelola keuangan Anda dengan lebih mudah dan cerdas!</p>
                 </div>
@@ -143,16 +96,16 @@ def login_register_page():
                 if not username_login or not password_login:
                     st.warning("Mohon isi username dan password")
                 else:
-                    conn = get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT password_hash FROM users WHERE username = ?", (username_login,))
-                    user_data = cursor.fetchone()
-                    conn.close()
+                    with connection() as conn:
+                        user_data = conn.execute("SELECT user_id, password_hash FROM users WHERE username = ?", (username_login,)).fetchone()
 
                     if user_data:
-                        if bcrypt.checkpw(password_login.encode('utf-8'), user_data[0]):
+                        if bcrypt.checkpw(password_login.encode('utf-8'), user_data[1]):
                             st.session_state["logged_in"] = True
+                            clear_user_session_state()
+                            st.session_state["user_id"] = user_data[0]
                             st.session_state["username"] = username_login
+                            user_profile.invalidate_profile()
                             st.session_state["current_page"] = "Home"
                             st.success("✅ Login Berhasil!")
                             st.rerun()
@@ -202,20 +155,38 @@ def login_register_page():
                 elif password_register != confirm_password_register:
                     st.error("Password dan konfirmasi password tidak cocok.")
                 else:
-                    conn = get_connection()
-                    cursor = conn.cursor()
-                    
-                    # Check if username already exists
-                    cursor.execute("SELECT * FROM users WHERE username = ?", (username_register,))
-                    if cursor.fetchone():
+                    # Check if username already exists (read only, so bcrypt is skipped for taken names)
+                    with connection() as conn:
+                        username_taken = conn.execute("SELECT 1 FROM users WHERE username = ?", (username_register,)).fetchone()
+                    if username_taken:
                         st.error("Username sudah ada. Mohon gunakan username lain.")
                     else:
+                        # bcrypt is slow on purpose: hash before taking the write lock
                         hashed_password = bcrypt.hashpw(password_register.encode('utf-8'), bcrypt.gensalt())
-                        cursor.execute("INSERT INTO users (username, password_hash, nama_akun) VALUES (?, ?, ?)", 
-                                       (username_register, hashed_password, username_register))
-                        conn.commit()
-                        st.success("✅ Registrasi Berhasil! Silakan Login.")
-                    conn.close()
+                        try:
+                            with transaction() as conn:
+                                conn.execute("INSERT INTO users (username, password_hash, nama_akun) VALUES (?, ?, ?)",
+                                             (username_register, hashed_password, username_register))
+                        except sqlite3.IntegrityError:
+                            # Registered by someone else between the check and the INSERT
+                            st.error("Username sudah ada. Mohon gunakan username lain.")
+                        else:
+                            st.success("✅ Registrasi Berhasil! Silakan Login.")
+
+# --- Session State per User ---
+# Hasil dan job forecasting serta posisi halaman Riwayat di session state milik
+# user yang sedang login. Dibuang saat login, logout dan hapus akun, supaya user
+# berikutnya di browser yang sama tidak melihat (atau menunggu) forecast milik
+# user sebelumnya atau melanjutkan dari kursor halamannya.
+def clear_user_session_state():
+    executor = forecast_jobs.get_executor()
+    forecast_job = st.session_state.pop("forecast_job", None) or {}
+    executor.cancel(forecast_job.get("job_id"))
+    forecast_batch = st.session_state.pop("forecast_batch", None) or {}
+    for job_id in forecast_batch.get("jobs", {}).values():
+        executor.cancel(job_id)
+    st.session_state.pop("riwayat_pages", None)
+
 
 # --- Logout Confirmation Page ---
 def logout_confirmation_page():
@@ -224,6 +195,9 @@ def logout_confirmation_page():
     if col_yes.button("Ya, Keluar"):
         st.session_state["logged_in"] = False
         st.session_state["username"] = None
+        st.session_state["user_id"] = None
+        user_profile.invalidate_profile()
+        clear_user_session_state()
         st.session_state["confirm_logout"] = False
         st.session_state["current_page"] = "Login" # Redirect to login page
         st.info("Anda telah berhasil keluar.")
@@ -260,23 +234,19 @@ def angka_input_with_format(label, key="formatted_input"):
 
 def home_page():
     tampilkan_logo_kiri_atas()
-    username = st.session_state["username"]
+    user_id = st.session_state["user_id"]
 
-    # Ambil nama akun dan foto di pojok kiri atas
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nama_akun, profile_pic FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    nama_akun = result[0] if result and result[0] else username
-    profile_pic = result[1] if result else None
+    # Nama akun dan foto di pojok kiri atas, dari profil sesi (tanpa query ke tabel users)
+    profile = user_profile.get_profile()
+    nama_akun = profile.display_name
+    profile_pic_uri = avatar_uri(user_id, profile.profile_pic_hash, images.AVATAR_SIZE_SMALL) if profile.profile_pic_hash else None
 
     # Tampilkan salam dan foto
     col1, col2 = st.columns([0.1, 0.9])
     with col1:
-        if profile_pic:
-            encoded = base64.b64encode(profile_pic).decode()
+        if profile_pic_uri:
             st.markdown(
-                f"""<img src="data:image/png;base64,{encoded}" 
+                f"""<img src="{profile_pic_uri}" 
                         style="width: 50px; height: 50px; border-radius: 50%; border: 2px solid #4CAF50;">""",
                 unsafe_allow_html=True
             )
@@ -299,9 +269,9 @@ def home_page():
     if jenis == "Pilih":
         kategori_options = ["Pilih"]
     elif jenis == "Pendapatan":
-        kategori_options = ["Pilih", "Keuntungan"]
+        kategori_options = ["Pilih"] + queries.KATEGORI_OPTIONS["pendapatan"]
     else: # jenis == "Pengeluaran"
-        kategori_options = ["Pilih", "Listrik", "Gaji", "PDAM", "Bahan Baku", "Sewa Tempat", "Lain-lain"]
+        kategori_options = ["Pilih"] + queries.KATEGORI_OPTIONS["pengeluaran"]
     
     kategori_index = 0
     if kategori_options and "Pilih" in kategori_options:
@@ -326,28 +296,31 @@ def home_page():
         st.write(f"Jumlah Nilai yang Di Input: Rp {formatted_display}")
 
     # Dana Darurat Settings
-    username = st.session_state["username"]
-    emergency_rate_from_db, _ = get_user_settings(username) # Renamed to avoid conflict
-
-    # Set initial_slider_value to 5 for new submissions
-    initial_slider_value = emergency_rate_from_db if emergency_rate_from_db is not None else 5 
-
-    new_rate = st.slider("Persentase Dana Darurat (%)", 5, 10, value=initial_slider_value, key=f"emergency_rate_slider_{st.session_state['input_key']}")
+    # Nilai slider hanya disimpan di widget state selama digeser; default user
+    # baru ditulis ke DB saat transaksi disimpan atau lewat tombol "Jadikan Default",
+    # jadi menggeser slider tidak lagi memicu write + rerun tambahan.
+    emergency_rate_from_db = profile.emergency_rate # Renamed to avoid conflict
+
+    # Profiles without a stored rate already default to 5. The slider is seeded via
+    # session state instead of value=, so saving a new default does not recreate it
+    slider_key = f"emergency_rate_slider_{st.session_state['input_key']}"
+    if slider_key not in st.session_state:
+        st.session_state[slider_key] = emergency_rate_from_db
+
+    new_rate = st.slider("Persentase Dana Darurat (%)", 5, 10, key=slider_key)
     
     if new_rate != emergency_rate_from_db: # Compare with the value from DB
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET emergency_rate = ? WHERE username = ?", (new_rate, username))
-        conn.commit()
-        conn.close()
-        st.rerun() # Add this line to make the change immediate
+        col_rate_info, col_rate_save = st.columns([0.75, 0.25])
+        col_rate_info.caption(f"Default tersimpan: {emergency_rate_from_db}%. Nilai {new_rate}% akan disimpan sebagai default saat data disimpan.")
+        if col_rate_save.button("Jadikan Default", key=f"save_emergency_rate_{st.session_state['input_key']}"):
+            with transaction() as conn:
+                conn.execute("UPDATE users SET emergency_rate = ? WHERE user_id = ?", (new_rate, user_id))
+            user_profile.invalidate_profile()
+            col_rate_info.success(f"✅ Default dana darurat disimpan: {new_rate}%.")
 
     keterangan = st.text_input("Keterangan (Opsional)", key=f"keterangan_{st.session_state['input_key']}")
 
-    bukti_img = None
     uploaded_img = st.file_uploader("Upload Bukti Gambar (opsional)", type=["png", "jpg", "jpeg"], key=f"bukti_img_{st.session_state['input_key']}")
-    if uploaded_img:
-        bukti_img = uploaded_img.read()
 
 
     if st.button("Simpan Data"):
@@ -363,107 +336,180 @@ def home_page():
 
         try:
             jumlah = int(jumlah_input.replace(".", "").replace(",", ""))
-            username = st.session_state["username"]
             # Use the 'new_rate' from the slider for calculation
             dana_darurat = int(jumlah * (new_rate / 100)) if jenis == "Pendapatan" else 0
 
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO laporan_keuangan (username, tanggal, kategori, jenis, jumlah, dana_darurat, keterangan, bukti_img)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (username, tanggal.isoformat(), kategori, jenis, jumlah, dana_darurat, keterangan, bukti_img))
-            conn.commit()
-            conn.close()
+            # Receipt is re-encoded and hashed before the write transaction starts
+            bukti_hash, bukti_data = None, None
+            if uploaded_img:
+                bukti_data, bukti_hash = receipts.prepare_receipt(uploaded_img.getvalue())
+
+            with transaction() as conn:
+                if bukti_hash:
+                    receipts.save_receipt(conn, bukti_hash, bukti_data)
+                conn.execute("""
+                    INSERT INTO laporan_keuangan (user_id, tanggal, kategori, jenis, jumlah, dana_darurat, keterangan, bukti_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (user_id, dates.to_epoch_days(tanggal), kategori, jenis.lower(), jumlah, dana_darurat, keterangan, bukti_hash))
+                # The slider value becomes the user's default in the same write transaction
+                if new_rate != emergency_rate_from_db:
+                    conn.execute("UPDATE users SET emergency_rate = ? WHERE user_id = ?", (new_rate, user_id))
+            cache.invalidate_user(user_id)
+            if new_rate != emergency_rate_from_db:
+                user_profile.invalidate_profile()
             st.success("✅ Data berhasil disimpan.")
             # Increment key to reset all input widgets after successful submission
             st.session_state["input_key"] += 1
             st.session_state["reset_report_filters"] = True # Set flag to reset report filters
             st.rerun()
+        except images.InvalidImageError as e:
+            st.error(f"Bukti gambar tidak dapat diproses: {e}")
         except ValueError:
             st.error("Jumlah harus berupa angka valid, contoh: 100000")
         except Exception as e:
             st.error(f"Terjadi kesalahan: {e}")
 
 
-def generate_forecasting_insights(df_forecast, periods, data_type):
-    insights = []
-    
-    # Filter forecast to only include future predictions
-    future_forecast = df_forecast.tail(periods)
-
-    if future_forecast.empty:
-        insights.append(f"Tidak ada data forecast {data_type} di masa depan untuk dianalisis.")
-        return insights
-
-    # Get the last historical value for comparison (from the part of df_forecast that's not future)
-    # We assume 'ds' is sorted and the last 'periods' rows are the future.
-    # So the last historical point would be just before the future period starts.
-    if len(df_forecast) > periods:
-        last_historical_value = df_forecast['yhat'].iloc[len(df_forecast) - periods - 1]
+@st.fragment(run_every=1)
+def forecast_job_progress(job_id):
+    # Only this fragment re-runs while the worker is busy; the rest of the page stays put
+    status = forecast_jobs.get_executor().status(job_id)
+    if status.state in ("pending", "running"):
+        label = "Menunggu giliran" if status.state == "pending" else "Sedang memproses"
+        st.info(f"⏳ {label} forecasting... ({status.elapsed:.0f} detik)")
     else:
-        # This case implies df_forecast largely consists of future data or very few historical points.
-        # If there's only future data, we can't compare to historical. Adjust this logic as needed.
-        if len(df_forecast) > 0: # If there's at least one data point
-             last_historical_value = df_forecast['yhat'].iloc[0] # Take the earliest if only future or very few points
-        else:
-            last_historical_value = 0 # Default if no data at all
+        st.rerun()
+
 
+def render_forecast_result(forecast_job):
+    forecast_type = forecast_job["forecast_type"]
+    result = forecast_job["result"]
+
+    # Plot the forecast
+    request = forecast_job["request"]
+    st.plotly_chart(forecasting.plot_forecast(request.df_for_forecast, result["forecast"]), use_container_width=True)
+    model_label = forecasting.ENGINE_LABELS[request.engine]
+    timings = result.get("timings") or {}
+    if request.engine == "prophet":
+        profile_label = {v: k for k, v in forecasting.PROFILE_LABELS.items()}[request.profile]
+        if timings.get("warm_start"):
+            profile_label += ", warm start"
+        model_label += f" ({profile_label})"
+    st.caption(f"Model: {model_label} · waktu fit {timings.get('fit', 0):.2f} detik · predict {timings.get('predict', 0):.2f} detik")
+    if forecast_job.get("cached"):
+        st.caption("Hasil forecasting diambil dari cache (data dan pengaturan tidak berubah).")
+
+    # Penjelasan untuk grafik forecasting
+    st.markdown("""
+        <h5 style='color: #4CAF50;'>Memahami Grafik Forecasting:</h5>
+        <ul>
+            <li><b style='color: #1a73e8;'>Garis Biru Tua:</b> Ini adalah prediksi (<i>yhat</i>) atau estimasi terbaik dari pendapatan/pengeluaran/keuntungan Anda di masa depan. Garis ini menunjukkan tren yang diperkirakan oleh model.</li>
+            <li><b style='color: #8ab4f8;'>Area Biru Muda:</b> Area ini mewakili rentang ketidakpastian atau interval kepercayaan dari prediksi (antara <i>yhat_lower</i> dan <i>yhat_upper</i>). Semakin lebar area ini, semakin besar ketidakpastian dalam prediksi.</li>
+            <li><b style='color: #333;'>Titik-titik Hitam:</b> Titik-titik ini adalah data historis aktual Anda yang digunakan oleh model untuk belajar dan membuat prediksi.</li>
+        </ul>
+    """, unsafe_allow_html=True)
 
-    # Calculate the average forecast for the future days
-    avg_forecast_future = future_forecast['yhat'].mean()
+    # --- Display Insights ---
+    st.subheader(f"💡 Insights dari Forecasting {forecast_type}")
+    for insight in result["insights"]:
+        st.markdown(f"- {insight}")
+    # --- End Display Insights ---
 
-    # Calculate the change from the last historical value to the end of the forecast period
-    final_forecast_value = future_forecast['yhat'].iloc[-1]
-    change = final_forecast_value - last_historical_value
-    
-    # Trend Analysis
-    if change > 0:
-        insights.append(f"{data_type.capitalize()} Anda diperkirakan akan menunjukkan tren meningkat dalam {periods} hari ke depan, dengan estimasi kenaikan sekitar Rp {change:,.0f} dari periode terakhir yang tercatat.")
-    elif change < 0:
-        insights.append(f"{data_type.capitalize()} Anda diperkirakan akan menunjukkan tren menurun dalam {periods} hari ke depan, dengan estimasi penurunan sekitar Rp {abs(change):,.0f} dari periode terakhir yang tercatat.")
-    else:
-        insights.append(f"{data_type.capitalize()} Anda diperkirakan akan cenderung stabil dalam {periods} hari ke depan.")
-
-    # Volatility/Uncertainty Analysis
-    # The range of uncertainty (yhat_upper - yhat_lower)
-    avg_uncertainty_range = (future_forecast['yhat_upper'] - future_forecast['yhat_lower']).mean()
-    if avg_forecast_future != 0: # Avoid division by zero
-        if avg_uncertainty_range < abs(avg_forecast_future) * 0.1: # Example threshold: less than 10% of average forecast
-            insights.append(f"Model menunjukkan tingkat kepercayaan yang tinggi terhadap prediksi ini, dengan rata-rata rentang ketidakpastian sekitar Rp {avg_uncertainty_range:,.0f} per hari.")
-        elif avg_uncertainty_range < abs(avg_forecast_future) * 0.3: # Example threshold: less than 30%
-            insights.append(f"Prediksi memiliki tingkat kepercayaan moderat, dengan rata-rata rentang ketidakpastian sekitar **Rp {avg_uncertainty_range:,.0f} per hari. Fluktuasi kecil mungkin terjadi.")
-        else:
-            insights.append(f"Ada ketidakpastian yang cukup tinggi dalam prediksi ini, dengan rata-rata rentang ketidakpastian sekitar Rp {avg_uncertainty_range:,.0f} per hari. Ini bisa disebabkan oleh data historis yang bervariasi. Pertimbangkan untuk menambahkan lebih banyak data atau memeriksa anomali.")
+
+@st.fragment(run_every=1)
+def forecast_batch_progress(job_ids):
+    executor = forecast_jobs.get_executor()
+    finished = sum(executor.status(job_id).state not in ("pending", "running") for job_id in job_ids)
+    if finished < len(job_ids):
+        st.progress(finished / len(job_ids), text=f"⏳ Forecasting semua seri... ({finished}/{len(job_ids)} selesai)")
     else:
-        insights.append(f"Tidak dapat menganalisis volatilitas karena {data_type} rata-rata yang diperkirakan adalah nol.")
+        st.rerun()
 
-    # Seasonal Analysis (simple check for daily/weekly patterns if present)
-    max_forecast_future = future_forecast['yhat'].max()
-    min_forecast_future = future_forecast['yhat'].min()
-    
-    if avg_forecast_future != 0 and (max_forecast_future - min_forecast_future) > (abs(avg_forecast_future) * 0.2): # If fluctuation is more than 20% of avg
-        insights.append(f"Terdapat indikasi pola musiman dalam {data_type}, dengan fluktuasi antara Rp {min_forecast_future:,.0f} dan Rp {max_forecast_future:,.0f} dalam {periods} hari ke depan. Perhatikan hari-hari atau periode tertentu yang mungkin memiliki {data_type} lebih tinggi atau lebih rendah.")
+
+def start_batch_forecast(user_id, rollup_df, forecast_periods, engine, profile):
+    # Semua seri dibangun dari satu groupby atas rollup yang sudah difilter
+    batch_series = forecasting.build_batch_series(rollup_df, queries.KATEGORI_OPTIONS["pengeluaran"])
+    requests = {}
+    skipped = []
+    for label, (df_for_forecast, data_type_label) in batch_series.items():
+        if len(df_for_forecast) >= 2:
+            requests[label] = forecasting.make_request(df_for_forecast, forecast_periods, data_type_label,
+                                                       engine=engine, profile=profile, user_id=user_id)
+        else:
+            skipped.append(label)
+
+    executor = forecast_jobs.get_executor()
+    previous_batch = st.session_state.get("forecast_batch") or {}
+    if previous_batch.get("user_id") != user_id:
+        previous_batch = {}  # never cancel or supersede another user's jobs
+    results = {}
+    cached_labels = []
+    to_submit = {}
+    for label, request in requests.items():
+        cached_result = forecasting.cached_forecast(request)
+        if cached_result is not None:
+            results[label] = cached_result
+            cached_labels.append(label)
+        elif request.engine == "holt_winters":
+            results[label] = forecasting.run_forecast(request)
+        else:
+            to_submit[label] = request
+
+    jobs = {}
+    if to_submit:
+        # Prophet fits go to the process pool together and run in parallel
+        job_ids = executor.submit_batch(user_id, list(to_submit.values()),
+                                        supersedes=previous_batch.get("jobs", {}).values())
+        jobs = dict(zip(to_submit, job_ids))
     else:
-        insights.append(f"Pola musiman yang signifikan tidak terlalu terlihat dalam periode prediksi ini, menunjukkan {data_type} yang cenderung lebih konsisten dari hari ke hari.")
+        for job_id in previous_batch.get("jobs", {}).values():
+            executor.cancel(job_id)
+
+    st.session_state["forecast_batch"] = {"user_id": user_id, "requests": requests, "results": results, "jobs": jobs,
+                                          "errors": {}, "skipped": skipped, "cached": cached_labels}
+
+
+def render_batch_forecast(forecast_batch):
+    requests = forecast_batch["requests"]
+    results = {label: forecast_batch["results"][label] for label in requests if label in forecast_batch["results"]}
+    st.subheader("📊 Hasil Forecasting Semua Seri")
+
+    if results:
+        periods = next(iter(requests.values())).forecast_periods
+        st.plotly_chart(forecasting.plot_batch_forecast(results, periods), use_container_width=True)
+
+        summary_df = forecasting.batch_summary(results, requests)
+        st.dataframe(summary_df, use_container_width=True, hide_index=True, column_config={
+            "Total Prediksi": formatting.rupiah_column("Total Prediksi"),
+            "Rata-rata per Hari": formatting.rupiah_column("Rata-rata per Hari"),
+            "Perubahan": formatting.rupiah_column("Perubahan"),
+            "Waktu (detik)": formatting.seconds_column("Waktu (detik)"),
+        })
+        if forecast_batch["cached"]:
+            st.caption(f"Diambil dari cache: {', '.join(forecast_batch['cached'])}.")
+
+        for label, result in results.items():
+            with st.expander(f"💡 Insights: {label}"):
+                for insight in result["insights"]:
+                    st.markdown(f"- {insight}")
 
-    return insights
+    if forecast_batch["skipped"]:
+        st.info(f"Tidak ada cukup data (minimal 2 data poin) untuk: {', '.join(forecast_batch['skipped'])}.")
+    for label, error in forecast_batch["errors"].items():
+        st.error(f"Terjadi kesalahan saat melakukan forecasting untuk {label}: {error}")
 
 
 def dashboard_page():
     st.title("📊 Dashboard Keuangan")
-    username = st.session_state["username"]
-    conn = get_connection()
-    df = pd.read_sql_query("SELECT * FROM laporan_keuangan WHERE username = ?", conn, params=(username,))
-    conn.close()
+    user_id = st.session_state["user_id"]
 
-    if df.empty:
+    # Per-user rollup frame, cached until the next write bumps the user's data generation
+    rollup_df = cache.cached_frame("daily_summary", user_id, queries.load_daily_summary)
+
+    if rollup_df.empty:
         st.info("Tidak ada data.")
         return
 
-    df["tanggal"] = pd.to_datetime(df["tanggal"])
-    df["jenis"] = df["jenis"].str.lower()
-
     # --- Filtering Section (Using columns for horizontal layout) ---
     st.subheader("Filter Data")
     col_jenis, col_kategori, col_waktu = st.columns(3)
@@ -472,106 +518,86 @@ def dashboard_page():
         jenis_filter = st.selectbox("Jenis Data", ["Semua", "Pendapatan", "Pengeluaran"], key="jenis_filter_dashboard")
 
     with col_kategori:
-        kategori_unik = sorted(df["kategori"].unique())
+        kategori_unik = queries.distinct_kategori(rollup_df)
         kategori_filter = st.selectbox("Kategori", ["Semua"] + kategori_unik, key="kategori_filter_dashboard")
 
     with col_waktu:
         filter_mode = st.selectbox("Filter Waktu", ["Semua", "Hari", "Bulan", "Tahun", "Rentang Tanggal"], key="waktu_filter_dashboard")
 
-    filtered_df = df.copy()
-
-    if jenis_filter != "Semua":
-        filtered_df = filtered_df[filtered_df["jenis"] == jenis_filter.lower()]
-
-    if kategori_filter != "Semua":
-        filtered_df = filtered_df[filtered_df["kategori"] == kategori_filter]
+    # Filters are collected into a LedgerFilter and applied to the cached rollup in memory
+    ledger_filter = queries.LedgerFilter(
+        jenis=jenis_filter.lower() if jenis_filter != "Semua" else None,
+        kategori=kategori_filter if kategori_filter != "Semua" else None,
+    )
+    no_data = False
 
     if filter_mode == "Hari":
         selected_date = st.date_input("Pilih Tanggal", key="date_input_dashboard")
         if selected_date:
-            filtered_df = filtered_df[filtered_df["tanggal"].dt.date == selected_date]
+            ledger_filter = replace(ledger_filter, start=selected_date, end=selected_date)
     elif filter_mode == "Bulan":
         bulan_list = [
             "Januari", "Februari", "Maret", "April", "Mei", "Juni",
             "Juli", "Agustus", "September", "Oktober", "November", "Desember"
         ]
-        unique_months_in_data = sorted(filtered_df["tanggal"].dt.month.unique())
+        unique_months_in_data = queries.available_months(ledger_filter.apply(rollup_df))
         display_months = [bulan_list[m-1] for m in unique_months_in_data]
         if display_months:
             selected_month_name = st.selectbox("Pilih Bulan", display_months, key="month_selectbox_dashboard")
             selected_month_num = bulan_list.index(selected_month_name) + 1
-            filtered_df = filtered_df[filtered_df["tanggal"].dt.month == selected_month_num]
+            ledger_filter = replace(ledger_filter, month=selected_month_num)
         else:
             st.info("Tidak ada data bulan yang tersedia untuk difilter.")
-            filtered_df = pd.DataFrame()
+            no_data = True
     elif filter_mode == "Tahun":
-        unique_years = sorted(filtered_df["tanggal"].dt.year.unique())
+        unique_years = queries.available_years(ledger_filter.apply(rollup_df))
         if unique_years:
             selected_year = st.selectbox("Pilih Tahun", unique_years, key="year_selectbox_dashboard")
-            filtered_df = filtered_df[filtered_df["tanggal"].dt.year == selected_year]
+            ledger_filter = replace(ledger_filter, year=selected_year)
         else:
             st.info("Tidak ada data tahun yang tersedia untuk difilter.")
-            filtered_df = pd.DataFrame()
+            no_data = True
     elif filter_mode == "Rentang Tanggal":
         date_range = st.date_input("Pilih Rentang Tanggal", [], key="date_range_dashboard")
         if len(date_range) == 2:
             start_date, end_date = date_range
-            filtered_df = filtered_df[(filtered_df["tanggal"] >= pd.to_datetime(start_date)) & (filtered_df["tanggal"] <= pd.to_datetime(end_date))]
+            ledger_filter = replace(ledger_filter, start=start_date, end=end_date)
         elif len(date_range) == 1:
             st.info("Pilih rentang tanggal (dua tanggal) atau satu tanggal untuk filter harian.")
-            filtered_df = pd.DataFrame()
+            no_data = True
 
-    if filtered_df.empty:
+    filtered_rollup = None if no_data else ledger_filter.apply(rollup_df)
+    if filtered_rollup is None or filtered_rollup.empty:
         st.info("Tidak ada data untuk filter yang dipilih.")
         return
 
-    # Assign filtered_df back to df for the rest of the dashboard calculations
-    df = filtered_df
-
     # --- Ringkasan Keuangan ---
     st.subheader("📋 Ringkasan Keuangan Anda")
-    total_pendapatan = df[df["jenis"] == "pendapatan"]["jumlah"].sum()
-    total_pengeluaran = df[df["jenis"] == "pengeluaran"]["jumlah"].sum()
+    summary = queries.summarize(filtered_rollup)
+    total_pendapatan = summary["total_pendapatan"]
+    total_pengeluaran = summary["total_pengeluaran"]
     keuntungan_bersih = total_pendapatan - total_pengeluaran
 
     col1, col2, col3 = st.columns(3)
 
-    with col1:
-        st.metric(label="💰 Total Pendapatan", value=f"Rp {total_pendapatan:,.0f}".replace(",", "."))
-        st.markdown(
-            """
-            <style>
-            [data-testid="stMetricValue"] {
-                font-size: 24px;
-                color: #4CAF50;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True,
-        )
+    # Metric colours come from the shared stylesheet (assets.APP_STYLESHEET), keyed by container
+    with col1, st.container(key="metric_pendapatan"):
+        st.metric(label="💰 Total Pendapatan", value=formatting.rupiah(total_pendapatan))
 
-    with col2:
-        st.metric(label="💸 Total Pengeluaran", value=f"Rp {total_pengeluaran:,.0f}".replace(",", "."))
-        st.markdown(
-            """
-            <style>
-            [data-testid="stMetricValue"] {
-                font-size: 24px;
-                color: #F44336;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True,
-        )
+    with col2, st.container(key="metric_pengeluaran"):
+        st.metric(label="💸 Total Pengeluaran", value=formatting.rupiah(total_pengeluaran))
 
     with col3:
         if keuntungan_bersih >= 0:
-            st.metric(label="📊 Keuntungan Bersih", value=f"Rp {keuntungan_bersih:,.0f}".replace(",", "."), delta="👍 Cukup Baik!" if keuntungan_bersih > 0 else None)
+            st.metric(label="📊 Keuntungan Bersih", value=formatting.rupiah(keuntungan_bersih), delta="👍 Cukup Baik!" if keuntungan_bersih > 0 else None)
         else:
-            st.metric(label="📊 Rugi Bersih", value=f"Rp {abs(keuntungan_bersih):,.0f}".replace(",", "."), delta="👎 Perlu Perhatian!")
+            st.metric(label="📊 Rugi Bersih", value=formatting.rupiah(abs(keuntungan_bersih)), delta="👎 Perlu Perhatian!")
 
     st.markdown("---")
-    st.info(f"Ringkasan ini mencakup data dari tanggal {df['tanggal'].min().strftime('%d %b %Y')} hingga {df['tanggal'].max().strftime('%d %b %Y')}.")
+    st.info(f"Ringkasan ini mencakup data dari tanggal {summary['first_date'].strftime('%d %b %Y')} hingga {summary['last_date'].strftime('%d %b %Y')}.")
+
+    # Small pre-aggregated result sets: one row per (tanggal, jenis) and per kategori
+    daily_df = queries.daily_totals(filtered_rollup)
 
     # --- Simplified Line Chart and Pie Chart Side-by-Side ---
     st.subheader("Visualisasi Data Keuangan")
@@ -586,7 +612,7 @@ def dashboard_page():
         else:
             y_data = ["pendapatan", "pengeluaran"]
 
-        daily_summary = df.groupby(["tanggal", "jenis"])["jumlah"].sum().unstack().fillna(0)
+        daily_summary = daily_df.pivot(index="tanggal", columns="jenis", values="jumlah").fillna(0)
         # Ensure 'pendapatan' and 'pengeluaran' columns exist even if no data for them
         if 'pendapatan' not in daily_summary.columns:
             daily_summary['pendapatan'] = 0
@@ -604,7 +630,7 @@ def dashboard_page():
 
     with chart_col2:
         # Pie Chart: Distribusi Kategori (Simplified)
-        kategori_sum = df.groupby("kategori")["jumlah"].sum().reset_index()
+        kategori_sum = queries.kategori_totals(filtered_rollup)
         kategori_sum.columns = ["Kategori", "Total Jumlah"]
 
         if not kategori_sum.empty:
@@ -624,181 +650,293 @@ def dashboard_page():
 
 
     st.subheader("📈 Forecasting")
-    
+
+    forecast_mode = st.radio("Mode Forecasting", ["Satu Seri", "Semua Seri & Kategori"], horizontal=True)
+    batch_mode = forecast_mode == "Semua Seri & Kategori"
+
     # New selectbox for forecasting type
-    forecast_type = st.selectbox("Pilih jenis data untuk Forecasting:", ["Pendapatan", "Pengeluaran", "Keuntungan (Pendapatan - Pengeluaran)"])
+    if not batch_mode:
+        forecast_type = st.selectbox("Pilih jenis data untuk Forecasting:", list(forecasting.FORECAST_TYPES))
     
     # Slider for number of forecast days
     forecast_periods = st.slider("Pilih berapa hari ke depan untuk prediksi:", 1, 365, 30)
+
+    forecast_engine = st.selectbox("Model Forecasting", list(forecasting.FORECAST_ENGINES),
+                                   help="Otomatis memakai Holt-Winters yang cepat untuk histori pendek/jarang, dan Prophet untuk histori panjang.")
+    forecast_profile = st.selectbox("Kualitas Forecast (Prophet)", list(forecasting.PROFILE_LABELS),
+                                    index=list(forecasting.PROFILE_LABELS.values()).index(forecasting.DEFAULT_PROFILE),
+                                    help="Cepat: sampel ketidakpastian & iterasi lebih sedikit. Akurat: pengaturan bawaan Prophet, paling lambat.")
     
     # Button to run forecasting
-    if st.button("Jalankan Forecasting"):
-        df_for_forecast = pd.DataFrame()
-        data_type_label = ""
-
-        if forecast_type == "Pendapatan":
-            df_for_forecast = df[df["jenis"] == "pendapatan"].copy()
-            df_for_forecast = df_for_forecast.groupby("tanggal")["jumlah"].sum().reset_index()
-            data_type_label = "pendapatan"
-        elif forecast_type == "Pengeluaran":
-            df_for_forecast = df[df["jenis"] == "pengeluaran"].copy()
-            df_for_forecast = df_for_forecast.groupby("tanggal")["jumlah"].sum().reset_index()
-            data_type_label = "pengeluaran"
-        elif forecast_type == "Keuntungan (Pendapatan - Pengeluaran)":
-            df_pendapatan_daily_df = df[df["jenis"] == "pendapatan"].groupby("tanggal")["jumlah"].sum().reset_index()
-            df_pengeluaran_daily_df = df[df["jenis"] == "pengeluaran"].groupby("tanggal")["jumlah"].sum().reset_index()
-            
-            # Merge to get all dates and corresponding amounts
-            merged_df = pd.merge(df_pendapatan_daily_df, df_pengeluaran_daily_df, 
-                                 on='tanggal', how='outer', suffixes=('_pendapatan', '_pengeluaran'))
-            
-            # Fill NaN values with 0
-            merged_df = merged_df.fillna(0)
-            
-            # Calculate net amount
-            merged_df['jumlah'] = merged_df['jumlah_pendapatan'] - merged_df['jumlah_pengeluaran']
-            
-            df_for_forecast = merged_df[['tanggal', 'jumlah']]
-            data_type_label = "keuntungan"
-
-        df_for_forecast.columns = ["ds", "y"]  # Rename columns for Prophet
-        df_for_forecast["ds"] = pd.to_datetime(df_for_forecast["ds"]) # Ensure 'ds' is datetime
+    run_clicked = st.button("Jalankan Forecasting")
+    if run_clicked and batch_mode:
+        try:
+            start_batch_forecast(user_id, filtered_rollup, forecast_periods,
+                                 forecasting.FORECAST_ENGINES[forecast_engine],
+                                 forecasting.PROFILE_LABELS[forecast_profile])
+        except forecast_jobs.TooManyJobsError as e:
+            st.warning(str(e))
+    elif run_clicked:
+        # daily_df is already summed per (tanggal, jenis)
+        df_for_forecast, data_type_label = forecasting.build_forecast_series(daily_df, forecast_type)
 
         # Check if there are enough data points for Prophet
         if len(df_for_forecast) >= 2:
-            try:
-                # Create and fit the model
-                model = Prophet()
-                # Add seasonality if data duration is sufficient
-                if (df_for_forecast['ds'].max() - df_for_forecast['ds'].min()).days >= 365 * 2: # At least 2 years for yearly
-                    model.add_seasonality(name='yearly', period=365.25, fourier_order=10)
-                if (df_for_forecast['ds'].max() - df_for_forecast['ds'].min()).days >= 7 * 2: # At least 2 weeks for weekly
-                    model.add_seasonality(name='weekly', period=7, fourier_order=3)
-
-
-                model.fit(df_for_forecast)
-
-                # Create future dates for forecasting
-                future = model.make_future_dataframe(periods=forecast_periods)  # Use selected periods
-                forecast = model.predict(future)
-
-                # Plot the forecast
-                fig_forecast = model.plot(forecast)
-                st.write(fig_forecast)
-                
-                # Penjelasan untuk grafik forecasting
-                st.markdown("""
-                    <h5 style='color: #4CAF50;'>Memahami Grafik Forecasting:</h5>
-                    <ul>
-                        <li><b style='color: #1a73e8;'>Garis Biru Tua:</b> Ini adalah prediksi (<i>yhat</i>) atau estimasi terbaik dari pendapatan/pengeluaran/keuntungan Anda di masa depan. Garis ini menunjukkan tren yang diperkirakan oleh model.</li>
-                        <li><b style='color: #8ab4f8;'>Area Biru Muda:</b> Area ini mewakili rentang ketidakpastian atau interval kepercayaan dari prediksi (antara <i>yhat_lower</i> dan <i>yhat_upper</i>). Semakin lebar area ini, semakin besar ketidakpastian dalam prediksi.</li>
-                        <li><b style='color: #333;'>Titik-titik Hitam:</b> Titik-titik ini adalah data historis aktual Anda yang digunakan oleh model untuk belajar dan membuat prediksi.</li>
-                    </ul>
-                """, unsafe_allow_html=True)
-
-
-                # --- Display Insights ---
-                st.subheader(f"💡 Insights dari Forecasting {forecast_type}")
-                insights = generate_forecasting_insights(forecast, forecast_periods, data_type_label)
-                for i, insight in enumerate(insights):
-                    st.markdown(f"- {insight}")
-                # --- End Display Insights ---
-
-            except Exception as e:
-                st.error(f"Terjadi kesalahan saat melakukan forecasting untuk {forecast_type}: {e}. Pastikan data Anda cukup bervariasi dan tidak kosong.")
+            request = forecasting.make_request(df_for_forecast, forecast_periods, data_type_label,
+                                               engine=forecasting.FORECAST_ENGINES[forecast_engine],
+                                               profile=forecasting.PROFILE_LABELS[forecast_profile],
+                                               user_id=user_id)
+            previous_job = st.session_state.get("forecast_job") or {}
+            if previous_job.get("user_id") != user_id:
+                previous_job = {}  # never cancel or supersede another user's job
+            # Identical series + settings are served from the forecast cache instead of refitting
+            cached_result = forecasting.cached_forecast(request)
+            if cached_result is not None:
+                forecast_jobs.get_executor().cancel(previous_job.get("job_id"))
+                st.session_state["forecast_job"] = {"user_id": user_id, "forecast_type": forecast_type, "request": request,
+                                                    "result": cached_result, "cached": True}
+            elif request.engine == "holt_winters":
+                # Millisecond fit: run inline, no need for the process pool
+                forecast_jobs.get_executor().cancel(previous_job.get("job_id"))
+                st.session_state["forecast_job"] = {"user_id": user_id, "forecast_type": forecast_type, "request": request,
+                                                    "result": forecasting.run_forecast(request)}
+            else:
+                try:
+                    # Fitting runs in the forecast process pool; this rerun only records the job id
+                    job_id = forecast_jobs.get_executor().submit(user_id, request, supersedes=previous_job.get("job_id"))
+                    st.session_state["forecast_job"] = {"user_id": user_id, "forecast_type": forecast_type,
+                                                        "request": request, "job_id": job_id}
+                except forecast_jobs.TooManyJobsError as e:
+                    st.warning(str(e))
         else:
             st.info(f"Tidak ada cukup data {forecast_type.lower()} (minimal 2 data poin) untuk melakukan forecasting.")
+
+    if batch_mode:
+        forecast_batch = st.session_state.get("forecast_batch")
+        if forecast_batch and forecast_batch["user_id"] != user_id:
+            forecast_batch = None  # left over from another login in this browser session
+        if forecast_batch and forecast_batch["jobs"]:
+            executor = forecast_jobs.get_executor()
+            for label, job_id in list(forecast_batch["jobs"].items()):
+                status = executor.status(job_id)
+                if status.state in ("pending", "running"):
+                    continue
+                if status.state == "done":
+                    forecast_batch["results"][label] = status.result
+                else:
+                    forecast_batch["errors"][label] = status.error or "Forecasting dibatalkan."
+                del forecast_batch["jobs"][label]
+            if forecast_batch["jobs"]:
+                forecast_batch_progress(list(forecast_batch["jobs"].values()))
+        if forecast_batch and not forecast_batch["jobs"]:
+            render_batch_forecast(forecast_batch)
+        return
+
+    forecast_job = st.session_state.get("forecast_job")
+    if forecast_job and forecast_job["user_id"] != user_id:
+        forecast_job = None  # left over from another login in this browser session
+    if forecast_job and "result" not in forecast_job:
+        status = forecast_jobs.get_executor().status(forecast_job["job_id"])
+        if status.state in ("pending", "running"):
+            forecast_job_progress(forecast_job["job_id"])
+        elif status.state == "done":
+            forecast_job["result"] = status.result
+        else:
+            if status.state == "error":
+                st.error(f"Terjadi kesalahan saat melakukan forecasting untuk {forecast_job['forecast_type']}: {status.error}. Pastikan data Anda cukup bervariasi dan tidak kosong.")
+            st.session_state["forecast_job"] = None
+
+    if forecast_job and "result" in forecast_job:
+        render_forecast_result(forecast_job)
     # --- End Forecasting Section ---
 
-def riwayat_page():
-    st.title("📜 Riwayat Input Keuangan")
-    username = st.session_state["username"]
-    conn = get_connection()
-    df = pd.read_sql_query("SELECT * FROM laporan_keuangan WHERE username = ?", conn, params=(username,))
-    conn.close()
+# --- Bulk actions (Riwayat) ---
+# Each action is one executemany in one transaction; the caller invalidates the
+# user cache and reruns once, whatever the number of selected rows.
+def bulk_delete(user_id, ids):
+    with transaction() as conn:
+        return conn.executemany("DELETE FROM laporan_keuangan WHERE id = ? AND user_id = ?",
+                                [(transaction_id, user_id) for transaction_id in ids]).rowcount
+
+
+def bulk_set_jenis_kategori(user_id, ids, jenis, kategori, emergency_rate):
+    # dana_darurat follows the new jenis, same rule as the input form
+    with transaction() as conn:
+        return conn.executemany("""
+            UPDATE laporan_keuangan
+            SET jenis = ?, kategori = ?,
+                dana_darurat = CASE WHEN ? = 'pendapatan' THEN jumlah * ? / 100 ELSE 0 END
+            WHERE id = ? AND user_id = ?
+        """, [(jenis, kategori, jenis, emergency_rate, transaction_id, user_id) for transaction_id in ids]).rowcount
 
-    if df.empty:
-        st.warning("Belum ada data.")
-        return
 
-    # Convert 'tanggal' to datetime64[ns] once. This allows .dt accessor for filtering.
-    df["tanggal"] = pd.to_datetime(df["tanggal"], errors='coerce')
+def bulk_recompute_dana_darurat(user_id, ids, emergency_rate):
+    with transaction() as conn:
+        return conn.executemany("""
+            UPDATE laporan_keuangan
+            SET dana_darurat = CASE WHEN jenis = 'pendapatan' THEN jumlah * ? / 100 ELSE 0 END
+            WHERE id = ? AND user_id = ?
+        """, [(emergency_rate, transaction_id, user_id) for transaction_id in ids]).rowcount
 
-    # Drop rows where 'tanggal' conversion failed (became NaT)
-    df.dropna(subset=['tanggal'], inplace=True)
 
-    if df.empty: # Check again if it became empty after dropping NaT
-        st.warning("Tidak ada data tanggal yang valid setelah pembersihan.")
+def riwayat_page():
+    st.title("📜 Riwayat Input Keuangan")
+    user_id = st.session_state["user_id"]
+    # The cached rollup supplies the filter choices and the row count; the table itself is paged from SQL
+    rollup_df = cache.cached_frame("daily_summary", user_id, queries.load_daily_summary)
+
+    if rollup_df.empty:
+        st.warning("Belum ada data.")
         return
 
     # --- Filtering Section ---
     st.subheader("Filter Riwayat")
     filter_mode = st.selectbox("Pilih Mode Filter", ["Semua", "Hari", "Bulan", "Tahun", "Rentang Tanggal"])
 
-    filtered_df = df.copy() # Create a copy to apply filters
+    ledger_filter = queries.LedgerFilter()
+    no_data = False
 
     if filter_mode == "Hari":
         selected_date = st.date_input("Pilih Tanggal")
         if selected_date: # Ensure a date is selected before filtering
-            # Compare datetime64[ns] to a date object
-            filtered_df = filtered_df[filtered_df["tanggal"].dt.date == selected_date]
+            ledger_filter = replace(ledger_filter, start=selected_date, end=selected_date)
     elif filter_mode == "Bulan":
         bulan_list = [
             "Januari", "Februari", "Maret", "April", "Mei", "Juni",
             "Juli", "Agustus", "September", "Oktober", "November", "Desember"
         ]
-        # Get unique months from the dataframe for the selectbox
-        unique_months_in_data = sorted(filtered_df["tanggal"].dt.month.unique())
+        # Get unique months from the rollup for the selectbox
+        unique_months_in_data = queries.available_months(rollup_df)
         display_months = [bulan_list[m-1] for m in unique_months_in_data]
 
         if display_months:
             selected_month_name = st.selectbox("Pilih Bulan", display_months)
             selected_month_num = bulan_list.index(selected_month_name) + 1
-            filtered_df = filtered_df[filtered_df["tanggal"].dt.month == selected_month_num]
+            unique_years = queries.available_years(rollup_df)
+            ledger_filter = replace(ledger_filter, month=selected_month_num,
+                                    years=(int(unique_years[0]), int(unique_years[-1])))
         else:
             st.info("Tidak ada data bulan yang tersedia untuk difilter.")
-            filtered_df = pd.DataFrame() # Empty dataframe if no months
+            no_data = True
 
     elif filter_mode == "Tahun":
-        unique_years = sorted(filtered_df["tanggal"].dt.year.unique())
+        unique_years = queries.available_years(rollup_df)
         if unique_years:
             selected_year = st.selectbox("Pilih Tahun", unique_years)
-            filtered_df = filtered_df[filtered_df["tanggal"].dt.year == selected_year]
+            ledger_filter = replace(ledger_filter, year=int(selected_year))
         else:
             st.info("Tidak ada data tahun yang tersedia untuk difilter.")
-            filtered_df = pd.DataFrame() # Empty dataframe if no years
+            no_data = True
     elif filter_mode == "Rentang Tanggal":
         date_range = st.date_input("Pilih Rentang Tanggal", [])
         if len(date_range) == 2:
             start_date, end_date = date_range
-            filtered_df = filtered_df[(filtered_df["tanggal"].dt.date >= start_date) & (filtered_df["tanggal"].dt.date <= end_date)]
+            ledger_filter = replace(ledger_filter, start=start_date, end=end_date)
         elif len(date_range) == 1:
             st.info("Pilih rentang tanggal (dua tanggal) atau satu tanggal untuk filter harian.")
-            filtered_df = pd.DataFrame()
+            no_data = True
 
-    if filtered_df.empty:
+    # Row count from the rollup's per-day counts: no COUNT(*) over the ledger
+    total_rows = 0 if no_data else queries.summarize(ledger_filter.apply(rollup_df))["count"]
+    if total_rows == 0:
         st.info("Tidak ada data untuk filter yang dipilih.")
         return
 
     # --- Tabular Display ---
     st.subheader("Tabel Riwayat Keuangan")
 
-    # Prepare DataFrame for display to format numbers and dates
-    display_df = filtered_df.copy()
-    display_df["jumlah"] = display_df["jumlah"].apply(lambda x: f"Rp {x:,.0f}".replace(",", "."))
-    display_df["dana_darurat"] = display_df["dana_darurat"].apply(lambda x: f"Rp {x:,.0f}".replace(",", "."))
-    display_df["tanggal"] = display_df["tanggal"].dt.strftime('%d-%m-%Y')
-
-    # Select columns to display and rename them for better readability
-    display_df = display_df[[
+    page_size = st.selectbox("Baris per halaman", queries.RIWAYAT_PAGE_SIZES,
+                             index=queries.RIWAYAT_PAGE_SIZES.index(queries.DEFAULT_RIWAYAT_PAGE_SIZE))
+    # Keyset pagination: remember the last (tanggal, id) of every page already visited
+    page_state = st.session_state.get("riwayat_pages")
+    if page_state is None or page_state["filter"] != (user_id, ledger_filter, page_size):
+        page_state = {"filter": (user_id, ledger_filter, page_size), "keys": [None]}
+        st.session_state["riwayat_pages"] = page_state
+    page_number = len(page_state["keys"])
+    page_df, next_key = queries.load_riwayat_page(user_id, ledger_filter, page_size, page_state["keys"][-1])
+
+    total_pages = max(1, -(-total_rows // page_size))
+    st.caption(f"Halaman {page_number} dari {total_pages} · {total_rows} transaksi")
+
+    # Numbers and dates stay raw; formatting happens in the browser via column_config
+    display_df = page_df[[
         "tanggal", "jenis", "kategori", "jumlah", "dana_darurat", "keterangan", "id"
-    ]]
-    display_df.columns = [
-        "Tanggal", "Jenis", "Kategori", "Jumlah", "Dana Darurat", "Keterangan", "ID"
-    ]
+    ]].assign(jenis=page_df["jenis"].str.capitalize())
+
+    flash = st.session_state.pop("riwayat_flash", None)
+    if flash:
+        st.success(flash)
+
+    # Row selection drives the bulk actions below; the key changes after each action to clear it
+    table_version = st.session_state.setdefault("riwayat_table_version", 0)
+    table_event = st.dataframe(display_df, use_container_width=True, hide_index=True,
+                               on_select="rerun", selection_mode="multi-row",
+                               key=f"riwayat_table_{table_version}_{page_number}", column_config={
+        "tanggal": formatting.date_column("Tanggal"),
+        "jenis": "Jenis",
+        "kategori": "Kategori",
+        "jumlah": formatting.rupiah_column("Jumlah"),
+        "dana_darurat": formatting.rupiah_column("Dana Darurat"),
+        "keterangan": "Keterangan",
+        "id": "ID",
+    })
+
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        if st.button("⬅️ Sebelumnya", disabled=page_number == 1):
+            page_state["keys"].pop()
+            st.rerun()
+    with next_col:
+        if st.button("Berikutnya ➡️", disabled=next_key is None):
+            page_state["keys"].append(next_key)
+            st.rerun()
 
-    # Display the DataFrame (read-only for deletion purposes)
-    st.dataframe(display_df, use_container_width=True, hide_index=True)
+    selected_ids = [int(display_df["id"].iloc[row]) for row in table_event.selection.rows]
+    if selected_ids:
+        with st.expander(f"☑️ Aksi Massal ({len(selected_ids)} transaksi dipilih)", expanded=True):
+            bulk_action = st.radio("Aksi", ["Hapus", "Ubah Jenis & Kategori", "Hitung Ulang Dana Darurat"],
+                                   horizontal=True, key="bulk_action")
+            bulk_jenis = bulk_kategori = None
+            if bulk_action == "Ubah Jenis & Kategori":
+                bulk_jenis = st.selectbox("Jenis Baru", ["Pendapatan", "Pengeluaran"], key="bulk_jenis")
+                bulk_kategori = st.selectbox("Kategori Baru", queries.KATEGORI_OPTIONS[bulk_jenis.lower()],
+                                             key="bulk_kategori")
+            elif bulk_action == "Hitung Ulang Dana Darurat":
+                st.caption("Dana darurat pendapatan dihitung ulang dengan persentase dana darurat Anda saat ini.")
+
+            if st.button(f"Terapkan ke {len(selected_ids)} Transaksi", key="bulk_apply"):
+                emergency_rate = user_profile.get_profile().emergency_rate
+                if bulk_action == "Hapus":
+                    changed = bulk_delete(user_id, selected_ids)
+                    message = f"✅ {changed} transaksi berhasil dihapus."
+                elif bulk_action == "Ubah Jenis & Kategori":
+                    changed = bulk_set_jenis_kategori(user_id, selected_ids, bulk_jenis.lower(), bulk_kategori,
+                                                      emergency_rate)
+                    message = f"✅ {changed} transaksi diubah menjadi {bulk_jenis} / {bulk_kategori}."
+                else:
+                    changed = bulk_recompute_dana_darurat(user_id, selected_ids, emergency_rate)
+                    message = f"✅ Dana darurat {changed} transaksi dihitung ulang ({emergency_rate}%)."
+                cache.invalidate_user(user_id)
+                st.session_state["riwayat_flash"] = message
+                st.session_state["riwayat_table_version"] = table_version + 1
+                st.rerun()
+
+    # --- Export (same filter as the table, streamed from SQLite) ---
+    with st.expander("⬇️ Export Riwayat"):
+        export_format = st.selectbox("Format File", list(exporter.EXPORT_FORMATS), key="export_format")
+        include_receipts = st.checkbox("Sertakan bukti gambar (file ZIP)", key="export_receipts")
+        if st.button("Siapkan File Export"):
+            try:
+                with st.spinner("Menyiapkan file export..."):
+                    export_file, file_name, mime = exporter.export_ledger(
+                        user_id, ledger_filter, exporter.EXPORT_FORMATS[export_format], include_receipts)
+                # Streamlit serves downloads from memory, so only the finished file is read in full;
+                # on_click="ignore": downloading must not rerun the page and drop the button
+                with export_file:
+                    st.download_button(f"⬇️ Unduh {file_name}", export_file.read(), file_name=file_name, mime=mime,
+                                       on_click="ignore")
+            except ImportError:
+                st.error("Format ini membutuhkan paket tambahan (pyarrow untuk Parquet, openpyxl untuk Excel).")
 
 
     st.markdown("---")
@@ -810,16 +948,14 @@ def riwayat_page():
             if delete_id:
                 try:
                     delete_id_int = int(delete_id)
-                    conn = get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM laporan_keuangan WHERE id = ? AND username = ?", (delete_id_int, username))
-                    conn.commit()
-                    if cursor.rowcount > 0:
+                    with transaction() as conn:
+                        deleted = conn.execute("DELETE FROM laporan_keuangan WHERE id = ? AND user_id = ?", (delete_id_int, user_id)).rowcount
+                    if deleted > 0:
+                        cache.invalidate_user(user_id)
                         st.success(f"✅ Transaksi dengan ID {delete_id} berhasil dihapus.")
                         st.rerun()
                     else:
                         st.error(f"Transaksi dengan ID {delete_id} tidak ditemukan atau Anda tidak memiliki izin untuk menghapusnya.")
-                    conn.close()
                 except ValueError:
                     st.error("ID harus berupa angka.")
             else:
@@ -834,21 +970,14 @@ def riwayat_page():
         if edit_id:
             try:
                 edit_id_int = int(edit_id)
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM laporan_keuangan WHERE id = ? AND username = ?", (edit_id_int, username))
-                entry_to_edit = cursor.fetchone()
-                conn.close()
+                entry_dict = queries.get_transaction(user_id, edit_id_int)
 
-                if entry_to_edit:
-                    # Map column names to fetched data
-                    columns = ["id", "username", "tanggal", "kategori", "jenis", "jumlah", "dana_darurat", "keterangan", "bukti_img"]
-                    entry_dict = dict(zip(columns, entry_to_edit))
+                if entry_dict:
 
                     st.write(f"Mengedit Transaksi ID: {edit_id_int}")
 
                     # Populate form with current values
-                    edited_tanggal = st.date_input("Tanggal Transaksi", value=datetime.strptime(entry_dict["tanggal"], '%Y-%m-%d').date(), key=f"edit_tanggal_{edit_id}")
+                    edited_tanggal = st.date_input("Tanggal Transaksi", value=entry_dict["tanggal"], key=f"edit_tanggal_{edit_id}")
                     
                     jenis_options = ["Pilih", "Pendapatan", "Pengeluaran"]
                     edited_jenis_index = jenis_options.index(entry_dict["jenis"].capitalize()) if entry_dict["jenis"].capitalize() in jenis_options else 0
@@ -858,9 +987,9 @@ def riwayat_page():
                     if edited_jenis == "Pilih":
                         kategori_options = ["Pilih"]
                     elif edited_jenis == "Pendapatan":
-                        kategori_options = ["Pilih", "Keuntungan"]
+                        kategori_options = ["Pilih"] + queries.KATEGORI_OPTIONS["pendapatan"]
                     else: # edited_jenis == "Pengeluaran"
-                        kategori_options = ["Pilih", "Listrik", "Gaji", "PDAM", "Bahan Baku", "Sewa Tempat", "Lain-lain"]
+                        kategori_options = ["Pilih"] + queries.KATEGORI_OPTIONS["pengeluaran"]
                     
                     edited_kategori_index = 0
                     if entry_dict["kategori"] in kategori_options:
@@ -874,16 +1003,13 @@ def riwayat_page():
                     
                     edited_jumlah_str = st.text_input("Jumlah (Rp)", value=str(entry_dict["jumlah"]), key=f"edit_jumlah_{edit_id}")
                     
-                    # Display current image if exists
-                    current_img_bytes = entry_dict["bukti_img"]
-                    if current_img_bytes:
-                        st.image(current_img_bytes, caption="Bukti Gambar Saat Ini", width=200)
-                        if st.checkbox("Hapus Bukti Gambar Saat Ini", key=f"delete_img_checkbox_{edit_id}"):
-                            current_img_bytes = None # Set to None if user wants to delete it
+                    # Display current image if exists (loaded lazily, only for this transaction)
+                    remove_img = False
+                    if entry_dict["bukti_hash"]:
+                        st.image(receipts.fetch_receipt(entry_dict["bukti_hash"]), caption="Bukti Gambar Saat Ini", width=200)
+                        remove_img = st.checkbox("Hapus Bukti Gambar Saat Ini", key=f"delete_img_checkbox_{edit_id}")
 
                     new_uploaded_img = st.file_uploader("Upload Bukti Gambar Baru (opsional)", type=["png", "jpg", "jpeg"], key=f"edit_bukti_img_{edit_id}")
-                    if new_uploaded_img:
-                        current_img_bytes = new_uploaded_img.read() # Overwrite with new upload
 
                     edited_keterangan = st.text_input("Keterangan (Opsional)", value=entry_dict["keterangan"] or "", key=f"edit_keterangan_{edit_id}")
 
@@ -903,20 +1029,27 @@ def riwayat_page():
                             
                             # Recalculate dana_darurat based on edited_jenis and updated emergency_rate
                             # Get the current emergency rate from user settings
-                            emergency_rate_from_db, _ = get_user_settings(username)
+                            emergency_rate_from_db = user_profile.get_profile().emergency_rate
                             edited_dana_darurat = int(edited_jumlah * (emergency_rate_from_db / 100)) if edited_jenis.lower() == "pendapatan" else 0
 
-                            conn = get_connection()
-                            cursor = conn.cursor()
-                            cursor.execute("""
-                                UPDATE laporan_keuangan
-                                SET tanggal = ?, kategori = ?, jenis = ?, jumlah = ?, dana_darurat = ?, keterangan = ?, bukti_img = ?
-                                WHERE id = ? AND username = ?
-                            """, (edited_tanggal.isoformat(), edited_kategori, edited_jenis.lower(), edited_jumlah, edited_dana_darurat, edited_keterangan, current_img_bytes, edit_id_int, username))
-                            conn.commit()
-                            conn.close()
+                            # Keep, replace (new upload wins) or remove the receipt reference
+                            bukti_hash, bukti_data = (None if remove_img else entry_dict["bukti_hash"]), None
+                            if new_uploaded_img:
+                                bukti_data, bukti_hash = receipts.prepare_receipt(new_uploaded_img.getvalue())
+
+                            with transaction() as conn:
+                                if bukti_data:
+                                    receipts.save_receipt(conn, bukti_hash, bukti_data)
+                                conn.execute("""
+                                    UPDATE laporan_keuangan
+                                    SET tanggal = ?, kategori = ?, jenis = ?, jumlah = ?, dana_darurat = ?, keterangan = ?, bukti_hash = ?
+                                    WHERE id = ? AND user_id = ?
+                                """, (dates.to_epoch_days(edited_tanggal), edited_kategori, edited_jenis.lower(), edited_jumlah, edited_dana_darurat, edited_keterangan, bukti_hash, edit_id_int, user_id))
+                            cache.invalidate_user(user_id)
                             st.success(f"✅ Transaksi ID {edit_id_int} berhasil diperbarui.")
                             st.rerun()
+                        except images.InvalidImageError as e:
+                            st.error(f"Bukti gambar tidak dapat diproses: {e}")
                         except ValueError:
                             st.error("Jumlah harus berupa angka valid, contoh: 100000")
                         except Exception as e:
@@ -930,27 +1063,75 @@ def riwayat_page():
             st.info("Masukkan ID transaksi untuk mengedit.")
 
 
+def import_page():
+    st.title("📥 Import Transaksi")
+    user_id = st.session_state["user_id"]
+
+    st.markdown(
+        "Unggah file **CSV** atau **XLSX** dengan kolom `tanggal`, `jenis`, `kategori`, `jumlah` "
+        "dan (opsional) `keterangan`. Jenis dan kategori mengikuti pilihan pada form input; "
+        "dana darurat dihitung otomatis dari persentase dana darurat Anda."
+    )
+    st.download_button("⬇️ Unduh Template CSV", importer.template_csv(), file_name="template_import_xpense.csv",
+                       mime="text/csv")
+
+    uploaded_file = st.file_uploader("Pilih file", type=["csv", "xlsx"], key="import_file")
+    if uploaded_file is None:
+        return
+
+    if st.button("Mulai Import"):
+        emergency_rate = user_profile.get_profile().emergency_rate
+        data = uploaded_file.getvalue()
+        try:
+            total_rows = importer.estimate_rows(data, uploaded_file.name)
+            progress = st.progress(0.0, text="Memulai import...")
+
+            def on_progress(rows_done):
+                progress.progress(min(rows_done / total_rows, 1.0), text=f"Memproses {rows_done} dari ±{total_rows} baris...")
+
+            inserted, rejected_df = importer.import_file(user_id, data, uploaded_file.name, emergency_rate, on_progress)
+        except importer.ImportFormatError as e:
+            st.error(str(e))
+            return
+        except ImportError:
+            st.error("Import file Excel membutuhkan paket openpyxl. Simpan file sebagai CSV atau instal openpyxl.")
+            return
+        except Exception as e:
+            st.error(f"Terjadi kesalahan saat membaca file: {e}")
+            return
+        finally:
+            # Chunks committed before an error are already in the ledger
+            cache.invalidate_user(user_id)
+
+        progress.progress(1.0, text="Import selesai.")
+        st.session_state["import_result"] = {"file": uploaded_file.name, "inserted": inserted, "rejected": rejected_df}
+
+    import_result = st.session_state.get("import_result")
+    if import_result and import_result["file"] == uploaded_file.name:
+        st.success(f"✅ {import_result['inserted']} transaksi berhasil diimport dari {import_result['file']}.")
+        rejected_df = import_result["rejected"]
+        if not rejected_df.empty:
+            st.warning(f"{len(rejected_df)} baris ditolak. Perbaiki baris berikut lalu import ulang hanya baris tersebut.")
+            st.dataframe(rejected_df, use_container_width=True, hide_index=True)
+            st.download_button("⬇️ Unduh Baris yang Ditolak", rejected_df.to_csv(index=False).encode(),
+                               file_name="baris_ditolak.csv", mime="text/csv")
+
+
 def akun_page():
     st.markdown("<h1 style='text-align: center;'>👤 Akun Saya</h1>", unsafe_allow_html=True)
-    username = st.session_state["username"]
+    user_id = st.session_state["user_id"]
 
-    # Get user settings
-    emergency_rate, profile_pic = get_user_settings(username)
-
-    # Get nama akun
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nama_akun FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    nama_akun = result[0] if result else ""
-    conn.close()
+    # Profil sesi; setiap jalur ubah di bawah memanggil invalidate_profile sebelum rerun
+    profile = user_profile.get_profile()
+    profile_pic_hash = profile.profile_pic_hash
+    nama_akun = profile.nama_akun or ""
 
     # FOTO PROFIL
-    if profile_pic:
-        encoded = base64.b64encode(profile_pic).decode()
+    profile_pic_uri = avatar_uri(user_id, profile_pic_hash, images.AVATAR_SIZE_LARGE) if profile_pic_hash else None
+    if profile_pic_uri:
         st.markdown(
             f"""<div style='text-align: center;'>
-                <img src="data:image/png;base64,{encoded}" 
+                <img src="{profile_pic_uri}" 
                         style="width: 200px; height: 200px; border-radius: 50%; border: 3px solid #4CAF50;">
             </div>""",
             unsafe_allow_html=True
@@ -959,22 +1140,25 @@ def akun_page():
         st.info("Belum ada foto profil. Unggah satu di bawah ini!")
 
     uploaded_pic = st.file_uploader("Upload Foto Profil Baru", type=["png", "jpg", "jpeg"])
-    if uploaded_pic:
-        img_bytes = uploaded_pic.read()
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET profile_pic = ? WHERE username = ?", (img_bytes, username))
-        conn.commit()
-        conn.close()
-        st.success("✅ Foto profil berhasil diperbarui.")
-        st.rerun()
+    # The uploader keeps its file across reruns, so only process each upload once
+    if uploaded_pic and st.session_state.get("processed_profile_pic_id") != uploaded_pic.file_id:
+        try:
+            small_bytes, large_bytes, content_hash = images.process_avatar(uploaded_pic.read())
+        except images.InvalidImageError as e:
+            st.error(f"Gagal memproses foto profil: {e}")
+        else:
+            with transaction() as conn:
+                conn.execute("UPDATE users SET profile_pic = ?, profile_pic_small = ?, profile_pic_hash = ? WHERE user_id = ?",
+                             (large_bytes, small_bytes, content_hash, user_id))
+            user_profile.invalidate_profile()
+            st.session_state["processed_profile_pic_id"] = uploaded_pic.file_id
+            st.success("✅ Foto profil berhasil diperbarui.")
+            st.rerun()
 
-    if profile_pic and st.button("🗑 Hapus Foto Profil"):
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET profile_pic = NULL WHERE username = ?", (username,))
-        conn.commit()
-        conn.close()
+    if profile_pic_uri and st.button("🗑 Hapus Foto Profil"):
+        with transaction() as conn:
+            conn.execute("UPDATE users SET profile_pic = NULL, profile_pic_small = NULL, profile_pic_hash = NULL WHERE user_id = ?", (user_id,))
+        user_profile.invalidate_profile()
         st.success("✅ Foto profil dihapus.")
         st.rerun()
 
@@ -984,11 +1168,9 @@ def akun_page():
     st.subheader("✍ Nama Akun")
     nama_baru = st.text_input("Ubah Nama Akun", value=nama_akun or "")
     if st.button("Simpan Nama Akun"):
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET nama_akun = ? WHERE username = ?", (nama_baru, username))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute("UPDATE users SET nama_akun = ? WHERE user_id = ?", (nama_baru, user_id))
+        user_profile.invalidate_profile()
         st.success("✅ Nama akun berhasil disimpan.")
         st.rerun()
 
@@ -999,25 +1181,25 @@ def akun_page():
         new_username = st.text_input("Username baru", key="new_username_input")
         if st.button("Simpan Username", key="save_username_button"):
             if new_username:
-                conn = get_connection()
-                cursor = conn.cursor()
+                renamed = False
                 try:
-                    # Check if the new username already exists
-                    cursor.execute("SELECT username FROM users WHERE username = ?", (new_username,))
-                    if cursor.fetchone():
-                        st.error("Username baru sudah digunakan. Mohon pilih username lain.")
-                    else:
-                        cursor.execute("UPDATE users SET username = ? WHERE username = ?", (new_username, username))
-                        cursor.execute("UPDATE laporan_keuangan SET username = ? WHERE username = ?", (new_username, username))
-                        cursor.execute("UPDATE target_anggaran SET username = ? WHERE username = ?", (new_username, username)) # Update target table as well
-                        conn.commit()
-                        st.session_state["username"] = new_username
-                        st.success("✅ Username berhasil diperbarui.")
-                        st.rerun()
+                    with transaction() as conn:
+                        cursor = conn.cursor()
+                        # Check if the new username already exists
+                        cursor.execute("SELECT username FROM users WHERE username = ?", (new_username,))
+                        if cursor.fetchone():
+                            st.error("Username baru sudah digunakan. Mohon pilih username lain.")
+                        else:
+                            # Data lain merujuk user_id, jadi cukup satu baris users yang berubah
+                            cursor.execute("UPDATE users SET username = ? WHERE user_id = ?", (new_username, user_id))
+                            renamed = True
                 except Exception as e:
                     st.error(f"Gagal memperbarui username: {e}")
-                finally:
-                    conn.close()
+                if renamed:
+                    st.session_state["username"] = new_username
+                    user_profile.invalidate_profile()
+                    st.success("✅ Username berhasil diperbarui.")
+                    st.rerun()
 
     with st.expander("Ganti Password"):
         current_pw = st.text_input("Password saat ini", type="password", key="current_pw_input")
@@ -1026,33 +1208,37 @@ def akun_page():
             if not current_pw or not new_pw:
                 st.warning("Mohon isi semua kolom.")
             else:
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
-                db_pw = cursor.fetchone()
+                # checkpw/hashpw run outside the transaction; only the UPDATE holds the write lock
+                with connection() as conn:
+                    db_pw = conn.execute("SELECT password_hash FROM users WHERE user_id = ?", (user_id,)).fetchone()
                 if db_pw and bcrypt.checkpw(current_pw.encode(), db_pw[0]):
                     new_hash = bcrypt.hashpw(new_pw.encode(), bcrypt.gensalt())
-                    cursor.execute("UPDATE users SET password_hash = ? WHERE username = ?", (new_hash, username))
-                    conn.commit()
-                    st.success("✅ Password berhasil diubah.")
+                    with transaction() as conn:
+                        # Only replace the hash that was checked, in case another session changed it meanwhile
+                        updated = conn.execute("UPDATE users SET password_hash = ? WHERE user_id = ? AND password_hash = ?",
+                                               (new_hash, user_id, db_pw[0])).rowcount
+                    if updated:
+                        user_profile.invalidate_profile()
+                        st.success("✅ Password berhasil diubah.")
+                    else:
+                        st.error("Password baru saja diubah dari sesi lain. Silakan coba lagi.")
                 else:
                     st.error("Password saat ini salah.")
-                conn.close()
 
     # HAPUS AKUN
     st.subheader("⚠ Hapus Akun")
     if st.button("🗑 Hapus Akun Saya", help="Tindakan ini tidak bisa dibatalkan"):
-        conn = get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("DELETE FROM users WHERE username = ?", (username,))
-            cursor.execute("DELETE FROM laporan_keuangan WHERE username = ?", (username,))
-            cursor.execute("DELETE FROM target_anggaran WHERE username = ?", (username,)) # Delete target data
-            conn.commit()
-            conn.close()
+            with transaction() as conn:
+                # laporan_keuangan, target_anggaran dan daily_summary ikut terhapus (ON DELETE CASCADE)
+                conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            cache.invalidate_user(user_id)
+            user_profile.invalidate_profile()
+            clear_user_session_state()
             st.success("Akun dan semua data terkait berhasil dihapus.")
             st.session_state["logged_in"] = False
             st.session_state["username"] = None
+            st.session_state["user_id"] = None
             st.session_state["current_page"] = "Login"
             st.rerun() 
         except Exception as e:
@@ -1067,33 +1253,22 @@ def main():
         st.session_state["logged_in"] = False
     if "username" not in st.session_state:
         st.session_state["username"] = None
+    if "user_id" not in st.session_state:
+        st.session_state["user_id"] = None
     if "current_page" not in st.session_state:
         st.session_state["current_page"] = "Home"
     if "confirm_logout" not in st.session_state:
         st.session_state["confirm_logout"] = False
 
-    # Custom CSS to make sidebar buttons the same size
-    st.markdown("""
-        <style>
-        .stButton > button {
-            width: 100%; /* Make buttons take full width of their container */
-            display: block; /* Ensure buttons are block level elements */
-            margin-bottom: 5px; /* Add some space between buttons */
-        }
-        .sidebar-button-container .stButton > button {
-            width: 150px; /* Adjust this value as needed for your desired fixed width */
-            text-align: center;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    # Single consolidated stylesheet for the whole app
+    assets.inject_stylesheet()
 
     if st.session_state["logged_in"]:
         # Add logo to sidebar
-        logo_base64 = base64.b64encode(open("Xpense V5.png", "rb").read()).decode()
         st.sidebar.markdown(
             f"""
             <div style='display: flex; justify-content: center; margin-bottom: 20px;'>
-                <img src='data:image/png;base64,{logo_base64}' width='100' style='border-radius: 50%; border: 2px solid #4CAF50;'>
+                <img src='{assets.logo_data_uri(assets.LOGO_SIZE_SIDEBAR)}' width='100' style='border-radius: 50%; border: 2px solid #4CAF50;'>
             </div>
             """,
             unsafe_allow_html=True
@@ -1112,6 +1287,9 @@ def main():
             st.session_state["confirm_logout"] = False # Ensure confirmation is hidden
         # Removed the "🗂️ Laporan" button
         # Removed the "🎯 Target & Anggaran" button
+        if st.sidebar.button("📥 Import"):
+            st.session_state["current_page"] = "Import"
+            st.session_state["confirm_logout"] = False # Ensure confirmation is hidden
         if st.sidebar.button("👤 Akun"):
             st.session_state["current_page"] = "Akun"
             st.session_state["confirm_logout"] = False # Ensure confirmation is hidden
@@ -1135,6 +1313,8 @@ def main():
                 riwayat_page()
             # Removed the "Laporan" page rendering
             # Removed the "Target & Anggaran" page rendering
+            elif st.session_state["current_page"] == "Import":
+                import_page()
             elif st.session_state["current_page"] == "Akun":
                 akun_page()
             
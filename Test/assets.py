@@ -0,0 +1,65 @@
+import base64
+import io
+
+import streamlit as st
+from PIL import Image
+
+# --- Static Assets ---
+# Logo dan stylesheet dimuat, diperkecil dan di-encode sekali per proses;
+# setiap rerun hanya memakai ulang data URI yang sudah jadi.
+LOGO_PATH = "Xpense V5.png"
+
+# Ukuran tampil logo: pojok kiri atas, sidebar, halaman login
+LOGO_SIZE_CORNER = 40
+LOGO_SIZE_SIDEBAR = 100
+LOGO_SIZE_LOGIN = 150
+
+APP_STYLESHEET = """
+<style>
+/* Custom CSS to make sidebar buttons the same size */
+.stButton > button {
+    width: 100%; /* Make buttons take full width of their container */
+    display: block; /* Ensure buttons are block level elements */
+    margin-bottom: 5px; /* Add some space between buttons */
+}
+.sidebar-button-container .stButton > button {
+    width: 150px; /* Adjust this value as needed for your desired fixed width */
+    text-align: center;
+}
+
+/* Dashboard "Ringkasan Keuangan" metrics */
+[data-testid="stMetricValue"] {
+    font-size: 24px;
+}
+.st-key-metric_pendapatan [data-testid="stMetricValue"] {
+    color: #4CAF50;
+}
+.st-key-metric_pengeluaran [data-testid="stMetricValue"] {
+    color: #F44336;
+}
+</style>
+"""
+
+
+@st.cache_resource(show_spinner=False)
+def _load_logo():
+    with Image.open(LOGO_PATH) as img:
+        return img.convert("RGBA")
+
+
+@st.cache_resource(show_spinner=False)
+def logo_image(size):
+    img = _load_logo().copy()
+    img.thumbnail((size, size), Image.LANCZOS)
+    return img
+
+
+@st.cache_resource(show_spinner=False)
+def logo_data_uri(size):
+    buffer = io.BytesIO()
+    logo_image(size).save(buffer, format="PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def inject_stylesheet():
+    st.markdown(APP_STYLESHEET, unsafe_allow_html=True)
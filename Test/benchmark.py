@@ -0,0 +1,233 @@
+import argparse
+import math
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import dates
+import forecasting
+import queries
+
+# --- Benchmark & Backtest Forecasting ---
+# Membuat ledger sintetis dengan skema laporan_keuangan lalu menjalankan
+# rolling-origin cross-validation untuk setiap forecaster. Hasilnya MAPE,
+# coverage interval, waktu fit/predict dan memori puncak per panjang histori,
+# supaya regresi akurasi maupun latensi ketahuan sebelum sampai ke produksi.
+#
+#   python benchmark.py backtest --years 3 --history-days 90 365 730
+#   python benchmark.py generate --db bench.db --users 5 --years 2
+LEDGER_COLUMNS = ["username", "tanggal", "kategori", "jenis", "jumlah", "dana_darurat", "keterangan"]
+BENCHMARK_PASSWORD = b"benchmark"
+
+PENDAPATAN_PROBABILITY = 0.4
+BASE_AMOUNT = {"pendapatan": 500_000, "pengeluaran": 150_000}
+EMERGENCY_RATE = 10
+
+
+def generate_ledger(users=1, years=2, transactions_per_day=3.0, seasonality=0.3, noise=0.25,
+                    start=None, seed=0):
+    """Synthetic ledger rows, one DataFrame in the ``laporan_keuangan`` column layout.
+
+    Amounts follow a weekly and a yearly sine wave (``seasonality`` is their
+    relative amplitude) times log-normal noise with sigma ``noise``; the number
+    of transactions per day is Poisson distributed.
+    """
+    rng = np.random.default_rng(seed)
+    days = int(round(years * 365))
+    start = start or date.today() - timedelta(days=days)
+    calendar = pd.date_range(start, periods=days, freq="D")
+    kategori_pengeluaran = queries.KATEGORI_OPTIONS["pengeluaran"]
+
+    frames = []
+    for user_index in range(users):
+        per_day = rng.poisson(transactions_per_day, size=days)
+        tanggal = calendar.repeat(per_day)
+        n = len(tanggal)
+        is_pendapatan = rng.random(n) < PENDAPATAN_PROBABILITY
+        jenis = np.where(is_pendapatan, "pendapatan", "pengeluaran")
+        kategori = np.where(is_pendapatan, queries.KATEGORI_OPTIONS["pendapatan"][0],
+                            rng.choice(kategori_pengeluaran, size=n))
+
+        weekly = np.sin(2 * math.pi * tanggal.dayofweek.to_numpy() / 7)
+        yearly = np.sin(2 * math.pi * tanggal.dayofyear.to_numpy() / 365.25)
+        base = np.where(is_pendapatan, BASE_AMOUNT["pendapatan"], BASE_AMOUNT["pengeluaran"])
+        amount = base * (1 + seasonality * (0.5 * weekly + yearly)) * rng.lognormal(0, noise, size=n)
+        jumlah = np.maximum(np.round(amount, -3), 1000).astype(int)
+
+        frames.append(pd.DataFrame({
+            "username": f"bench_{user_index + 1}",
+            "tanggal": dates.datetime_to_epoch_days(tanggal),
+            "kategori": kategori,
+            "jenis": jenis,
+            "jumlah": jumlah,
+            "dana_darurat": np.where(is_pendapatan, jumlah * EMERGENCY_RATE // 100, 0),
+            "keterangan": "sintetis",
+        }))
+    return pd.concat(frames, ignore_index=True)[LEDGER_COLUMNS]
+
+
+def write_ledger(db_path, ledger, batch_size=5000):
+    """Insert a synthetic ledger into a (migrated) database; rollup triggers keep daily_summary in sync."""
+    import bcrypt
+
+    from database import ConnectionPool, migrate
+
+    pool = ConnectionPool(db_path)
+    conn = pool.acquire()
+    try:
+        migrate(conn)
+        password_hash = bcrypt.hashpw(BENCHMARK_PASSWORD, bcrypt.gensalt())
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT OR IGNORE INTO users (username, password_hash, emergency_rate) VALUES (?, ?, ?)",
+                         [(username, password_hash, EMERGENCY_RATE) for username in ledger["username"].unique()])
+        conn.execute("COMMIT")
+        user_ids = dict(conn.execute("SELECT username, user_id FROM users").fetchall())
+        # laporan_keuangan is keyed by user_id; the username column only lives in users
+        ledger_columns = ["user_id"] + LEDGER_COLUMNS[1:]
+        rows = list(ledger.assign(username=ledger["username"].map(user_ids)).itertuples(index=False, name=None))
+        for offset in range(0, len(rows), batch_size):
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(f"""
+                INSERT INTO laporan_keuangan ({", ".join(ledger_columns)})
+                VALUES ({", ".join("?" * len(ledger_columns))})
+            """, rows[offset:offset + batch_size])
+            conn.execute("COMMIT")
+    finally:
+        pool.release(conn)
+        pool.close_all()
+
+
+def ledger_daily_totals(ledger):
+    # Same (tanggal, jenis) totals the dashboard feeds into forecasting
+    df = ledger.assign(tanggal=dates.epoch_days_to_datetime(ledger["tanggal"]))
+    return queries.daily_totals(df)
+
+
+def rolling_origins(series, history_days, horizon, folds):
+    """Yield ``(train, test)`` pairs whose cutoffs step back ``horizon`` days from the end of ``series``."""
+    end = series["ds"].max()
+    for fold in range(folds, 0, -1):
+        cutoff = end - pd.Timedelta(days=horizon * fold)
+        train = series[(series["ds"] <= cutoff) & (series["ds"] > cutoff - pd.Timedelta(days=history_days))]
+        test = series[(series["ds"] > cutoff) & (series["ds"] <= cutoff + pd.Timedelta(days=horizon))]
+        if len(train) >= 2 and not test.empty:
+            yield train.reset_index(drop=True), test.reset_index(drop=True)
+
+
+def evaluate(forecast, test):
+    """MAPE (over non-zero actuals) and interval coverage of ``forecast`` on ``test``."""
+    joined = test.merge(forecast, on="ds", how="inner")
+    nonzero = joined[joined["y"] != 0]
+    mape = (np.abs((nonzero["y"] - nonzero["yhat"]) / nonzero["y"]).mean() * 100) if not nonzero.empty else np.nan
+    covered = (joined["y"] >= joined["yhat_lower"]) & (joined["y"] <= joined["yhat_upper"])
+    return mape, covered.mean() * 100 if not joined.empty else np.nan
+
+
+def backtest(daily_df, forecast_type, history_days, engines, horizon=30, folds=3, profile=forecasting.DEFAULT_PROFILE):
+    """One row per (engine, history length, fold) with accuracy, timings and peak Python memory."""
+    series, data_type_label = forecasting.build_forecast_series(daily_df, forecast_type)
+    rows = []
+    for engine in engines:
+        for days in history_days:
+            for fold, (train, test) in enumerate(rolling_origins(series, days, horizon, folds), start=1):
+                # No user_id: backtests never warm-start from (or overwrite) a user's model state
+                request = forecasting.make_request(train, horizon, data_type_label, engine=engine, profile=profile)
+                # Python-side peak only: cmdstanpy runs the Stan optimizer in its own process
+                tracemalloc.start()
+                started = time.perf_counter()
+                try:
+                    result = forecasting.compute_forecast(request)
+                    elapsed = time.perf_counter() - started
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                mape, coverage = evaluate(result["forecast"], test)
+                rows.append({
+                    "engine": engine,
+                    "history_days": days,
+                    "fold": fold,
+                    "train_points": len(train),
+                    "mape": mape,
+                    "coverage": coverage,
+                    "fit_s": result["timings"]["fit"],
+                    "predict_s": result["timings"]["predict"],
+                    "total_s": elapsed,
+                    "peak_mib": peak / (1024 * 1024),
+                })
+    return pd.DataFrame(rows)
+
+
+def summarize_backtest(results):
+    return results.groupby(["engine", "history_days"], as_index=False).agg(
+        folds=("fold", "count"),
+        train_points=("train_points", "mean"),
+        mape=("mape", "mean"),
+        coverage=("coverage", "mean"),
+        fit_s=("fit_s", "mean"),
+        predict_s=("predict_s", "mean"),
+        total_s=("total_s", "max"),
+        peak_mib=("peak_mib", "max"),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dan backtest forecasting Xpense")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_ledger_arguments(subparser):
+        subparser.add_argument("--users", type=int, default=1)
+        subparser.add_argument("--years", type=float, default=2)
+        subparser.add_argument("--transactions-per-day", type=float, default=3.0)
+        subparser.add_argument("--seasonality", type=float, default=0.3, help="Amplitudo relatif pola mingguan/tahunan")
+        subparser.add_argument("--noise", type=float, default=0.25, help="Sigma noise log-normal")
+        subparser.add_argument("--seed", type=int, default=0)
+
+    generate_parser = subparsers.add_parser("generate", help="Tulis ledger sintetis ke database SQLite")
+    generate_parser.add_argument("--db", required=True, help="Path file SQLite tujuan (dimigrasi bila perlu)")
+    add_ledger_arguments(generate_parser)
+
+    backtest_parser = subparsers.add_parser("backtest", help="Rolling-origin cross-validation per panjang histori")
+    add_ledger_arguments(backtest_parser)
+    backtest_parser.add_argument("--type", default="Pendapatan", choices=list(forecasting.FORECAST_TYPES))
+    backtest_parser.add_argument("--history-days", type=int, nargs="+", default=[90, 180, 365, 730])
+    backtest_parser.add_argument("--engines", nargs="+", default=["prophet", "holt_winters"],
+                                 choices=[e for e in forecasting.FORECAST_ENGINES.values() if e != "auto"])
+    backtest_parser.add_argument("--profile", default=forecasting.DEFAULT_PROFILE, choices=list(forecasting.PROPHET_PROFILES))
+    backtest_parser.add_argument("--horizon", type=int, default=30)
+    backtest_parser.add_argument("--folds", type=int, default=3)
+    backtest_parser.add_argument("--output", help="Simpan hasil per fold ke CSV")
+    backtest_parser.add_argument("--max-seconds", type=float,
+                                 help="Keluar dengan status 1 jika fit+predict terlama melebihi batas ini")
+    args = parser.parse_args(argv)
+
+    ledger = generate_ledger(args.users, args.years, args.transactions_per_day, args.seasonality,
+                             args.noise, seed=args.seed)
+    if args.command == "generate":
+        write_ledger(args.db, ledger)
+        print(f"{len(ledger)} transaksi sintetis untuk {args.users} user ditulis ke {args.db}.")
+        return 0
+
+    results = []
+    for username, user_ledger in ledger.groupby("username"):
+        user_results = backtest(ledger_daily_totals(user_ledger), args.type, args.history_days, args.engines,
+                                args.horizon, args.folds, args.profile)
+        results.append(user_results.assign(username=username))
+    results = pd.concat(results, ignore_index=True)
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+    with pd.option_context("display.width", 160, "display.float_format", "{:.3f}".format):
+        print(summarize_backtest(results).to_string(index=False))
+
+    if args.max_seconds is not None and results["total_s"].max() > args.max_seconds:
+        print(f"Regresi latensi: fit+predict terlama {results['total_s'].max():.2f} detik > {args.max_seconds} detik.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+# Batas cache DataFrame per proses, dipakai bersama oleh semua sesi
+MAX_CACHE_ENTRIES = 512
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _frame_size(frame):
+    try:
+        return int(frame.memory_usage(deep=True).sum())
+    except AttributeError:
+        return 0
+
+
+class UserDataCache:
+    """LRU cache DataFrame per user, dikunci dengan (kind, user_id, generation).
+
+    Setiap jalur tulis memanggil ``invalidate_user`` yang menaikkan generation
+    user tersebut, sehingga entri lama tidak pernah terbaca lagi dan langsung
+    dibuang. Frame yang dikembalikan dipakai bersama: jangan diubah in-place.
+    """
+
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES, max_bytes=MAX_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [key for key in self._entries if key[1] == user_id]:
+                self._drop(key)
+
+    def get_or_load(self, kind, user_id, loader):
+        with self._lock:
+            key = (kind, user_id, self._generations.get(user_id, 0))
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+        # Loaded outside the lock so one slow user does not block the others
+        frame = loader(user_id)
+        size = _frame_size(frame)
+
+        with self._lock:
+            # A write landed while loading: return the frame but do not cache it
+            if key[2] != self._generations.get(user_id, 0):
+                return frame
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (frame, size)
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+            return frame
+
+    def _drop(self, key):
+        _, size = self._entries.pop(key)
+        self._total_bytes -= size
+
+
+@st.cache_resource(show_spinner=False)
+def get_user_data_cache():
+    return UserDataCache()
+
+
+def cached_frame(kind, user_id, loader):
+    return get_user_data_cache().get_or_load(kind, user_id, loader)
+
+
+def invalidate_user(user_id):
+    get_user_data_cache().invalidate_user(user_id)
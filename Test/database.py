@@ -0,0 +1,633 @@
+import hashlib
+import queue
+import secrets
+import sqlite3
+from contextlib import contextmanager
+
+import streamlit as st
+
+import images
+
+# --- Database Connection ---
+DB_NAME = "users.db"
+
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 16 * 1024
+MAX_IDLE_CONNECTIONS = 8
+
+
+class ConnectionPool:
+    """Pool koneksi SQLite yang dipakai bersama oleh semua sesi Streamlit.
+
+    Setiap sesi/thread meminjam koneksi selama satu blok ``with`` lalu
+    mengembalikannya, sehingga koneksi (beserta PRAGMA dan page cache-nya)
+    dipakai ulang antar rerun alih-alih dibuka per statement.
+    """
+
+    def __init__(self, path, max_idle=MAX_IDLE_CONNECTIONS):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly by transaction()
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        # Per connection in SQLite: ON DELETE CASCADE only works with this on
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+@st.cache_resource(show_spinner=False)
+def get_pool():
+    return ConnectionPool(DB_NAME)
+
+
+@contextmanager
+def connection():
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait
+    # on busy_timeout instead of failing later with "database is locked"
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+# --- Schema Migrations ---
+# Versi skema disimpan di PRAGMA user_version. Setiap langkah di MIGRATIONS
+# dijalankan tepat satu kali, berurutan, di dalam transaksinya sendiri.
+# Tambahkan langkah baru di akhir daftar; jangan mengubah langkah yang sudah dirilis.
+
+def _column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _migration_001_base_schema(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password_hash TEXT NOT NULL,
+        role TEXT DEFAULT 'user',
+        profile_pic BLOB,
+        emergency_rate INTEGER DEFAULT 10,
+        nama_akun TEXT
+    )
+    """)
+
+    # Database lama dibuat sebelum kolom nama_akun ada
+    if not _column_exists(cursor, "users", "nama_akun"):
+        cursor.execute("ALTER TABLE users ADD COLUMN nama_akun TEXT")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS laporan_keuangan (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        tanggal TEXT,
+        kategori TEXT,
+        jenis TEXT,
+        jumlah INTEGER,
+        dana_darurat INTEGER,
+        keterangan TEXT,
+        bukti_img BLOB
+    )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS target_anggaran (
+            username TEXT,
+            bulan TEXT,
+            tahun INTEGER,
+            target_pengeluaran INTEGER,
+            target_tabungan INTEGER,
+            target_investasi INTEGER,
+            PRIMARY KEY (username, bulan, tahun)
+        )
+    """)
+
+
+def _migration_002_ledger_indexes(cursor):
+    # Composite (username, tanggal) index, widened with the columns the dashboard
+    # reads so per-user/per-period aggregates are answered from the index alone.
+    # Riwayat uses the same (username, tanggal) prefix for its range scans.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_laporan_keuangan_user_tanggal
+        ON laporan_keuangan (username, tanggal, jenis, kategori, jumlah)
+    """)
+    cursor.execute("ANALYZE laporan_keuangan")
+
+
+def _migration_003_lowercase_jenis(cursor):
+    # Home dulu menyimpan "Pendapatan" sedangkan form edit menyimpan "pendapatan".
+    # Satu bentuk saja agar filter jenis bisa berupa perbandingan biasa di index.
+    cursor.execute("UPDATE laporan_keuangan SET jenis = lower(jenis) WHERE jenis <> lower(jenis)")
+
+
+# --- Daily Rollup ---
+# daily_summary menyimpan total per (user_id, tanggal, jenis, kategori) dan
+# dijaga oleh trigger pada laporan_keuangan, sehingga setiap INSERT, UPDATE,
+# DELETE dan hapus akun (ON DELETE CASCADE) memperbarui rollup di transaksi yang sama.
+# Sebelum migrasi 008 pemilik baris adalah kolom username; owner_column
+# menjaga migrasi lama tetap berjalan dengan skema saat itu.
+
+_ROLLUP_KEY = "COALESCE({row}.{owner}, ''), COALESCE({row}.tanggal, ''), COALESCE({row}.jenis, ''), COALESCE({row}.kategori, '')"
+_ROLLUP_MATCH = ("{owner} = COALESCE({row}.{owner}, '') AND tanggal = COALESCE({row}.tanggal, '') "
+                 "AND jenis = COALESCE({row}.jenis, '') AND kategori = COALESCE({row}.kategori, '')")
+
+
+def _rollup_add(row, owner):
+    return f"""
+        INSERT INTO daily_summary ({owner}, tanggal, jenis, kategori, total, count, dana_darurat)
+        VALUES ({_ROLLUP_KEY.format(row=row, owner=owner)}, COALESCE({row}.jumlah, 0), 1, COALESCE({row}.dana_darurat, 0))
+        ON CONFLICT ({owner}, tanggal, jenis, kategori) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + 1,
+            dana_darurat = dana_darurat + excluded.dana_darurat;
+    """
+
+
+def _rollup_subtract(row, owner):
+    return f"""
+        UPDATE daily_summary SET
+            total = total - COALESCE({row}.jumlah, 0),
+            count = count - 1,
+            dana_darurat = dana_darurat - COALESCE({row}.dana_darurat, 0)
+        WHERE {_ROLLUP_MATCH.format(row=row, owner=owner)};
+        DELETE FROM daily_summary WHERE {_ROLLUP_MATCH.format(row=row, owner=owner)} AND count <= 0;
+    """
+
+
+def create_rollup_triggers(cursor, owner_column="user_id"):
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_daily_summary_insert AFTER INSERT ON laporan_keuangan
+        BEGIN {_rollup_add("NEW", owner_column)} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_daily_summary_delete AFTER DELETE ON laporan_keuangan
+        BEGIN {_rollup_subtract("OLD", owner_column)} END
+    """)
+    # Receipt-only updates (bukti_hash, keterangan) do not touch the rollup
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_daily_summary_update
+        AFTER UPDATE OF {owner_column}, tanggal, jenis, kategori, jumlah, dana_darurat ON laporan_keuangan
+        BEGIN {_rollup_subtract("OLD", owner_column)} {_rollup_add("NEW", owner_column)} END
+    """)
+
+
+def rebuild_daily_summary(cursor, user_id=None, owner_column="user_id"):
+    # Backfill penuh (atau per user) langsung dari laporan_keuangan
+    user_clause = f"WHERE {owner_column} = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    cursor.execute(f"DELETE FROM daily_summary {user_clause}", params)
+    cursor.execute(f"""
+        INSERT INTO daily_summary ({owner_column}, tanggal, jenis, kategori, total, count, dana_darurat)
+        SELECT COALESCE({owner_column}, ''), COALESCE(tanggal, ''), COALESCE(jenis, ''), COALESCE(kategori, ''),
+               SUM(COALESCE(jumlah, 0)), COUNT(*), SUM(COALESCE(dana_darurat, 0))
+        FROM laporan_keuangan {user_clause}
+        GROUP BY 1, 2, 3, 4
+    """, params)
+
+
+def _migration_004_daily_summary(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_summary (
+            username TEXT NOT NULL,
+            tanggal TEXT NOT NULL,
+            jenis TEXT NOT NULL,
+            kategori TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            dana_darurat INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, tanggal, jenis, kategori)
+        ) WITHOUT ROWID
+    """)
+    create_rollup_triggers(cursor, owner_column="username")
+    rebuild_daily_summary(cursor, owner_column="username")
+
+
+def _migration_005_avatar_thumbnails(cursor):
+    # profile_pic now holds the 200px thumbnail; profile_pic_small the 50px one
+    cursor.execute("ALTER TABLE users ADD COLUMN profile_pic_small BLOB")
+    cursor.execute("ALTER TABLE users ADD COLUMN profile_pic_hash TEXT")
+    rows = cursor.execute("SELECT username, profile_pic FROM users WHERE profile_pic IS NOT NULL").fetchall()
+    for username, raw in rows:
+        try:
+            small, large, content_hash = images.process_avatar(raw)
+        except images.InvalidImageError:
+            # Keep an undecodable original as-is rather than losing it
+            small, large, content_hash = raw, raw, hashlib.sha256(raw).hexdigest()
+        cursor.execute(
+            "UPDATE users SET profile_pic = ?, profile_pic_small = ?, profile_pic_hash = ? WHERE username = ?",
+            (large, small, content_hash, username)
+        )
+
+
+def _migration_006_receipt_store(cursor):
+    # Content-addressed receipt store: transactions keep only the SHA-256 key
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS receipts (
+            hash TEXT PRIMARY KEY,
+            mime TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("ALTER TABLE laporan_keuangan ADD COLUMN bukti_hash TEXT REFERENCES receipts(hash)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_laporan_keuangan_bukti_hash
+        ON laporan_keuangan (bukti_hash) WHERE bukti_hash IS NOT NULL
+    """)
+
+    create_receipt_gc_triggers(cursor)
+
+    # Move the inline BLOBs over, one row at a time to keep memory flat
+    ids = [row[0] for row in cursor.execute("SELECT id FROM laporan_keuangan WHERE bukti_img IS NOT NULL").fetchall()]
+    for transaction_id in ids:
+        raw = cursor.execute("SELECT bukti_img FROM laporan_keuangan WHERE id = ?", (transaction_id,)).fetchone()[0]
+        try:
+            data, content_hash = images.process_receipt(raw)
+        except images.InvalidImageError:
+            data, content_hash = raw, hashlib.sha256(raw).hexdigest()
+        insert_receipt(cursor, content_hash, data)
+        cursor.execute("UPDATE laporan_keuangan SET bukti_hash = ?, bukti_img = NULL WHERE id = ?",
+                       (content_hash, transaction_id))
+
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute("ALTER TABLE laporan_keuangan DROP COLUMN bukti_img")
+
+
+def create_receipt_gc_triggers(cursor):
+    # Drop a receipt as soon as no transaction references it any more
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_receipts_gc_delete AFTER DELETE ON laporan_keuangan
+        WHEN OLD.bukti_hash IS NOT NULL
+        BEGIN
+            DELETE FROM receipts WHERE hash = OLD.bukti_hash
+            AND NOT EXISTS (SELECT 1 FROM laporan_keuangan WHERE bukti_hash = OLD.bukti_hash);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_receipts_gc_update AFTER UPDATE OF bukti_hash ON laporan_keuangan
+        WHEN OLD.bukti_hash IS NOT NULL AND OLD.bukti_hash IS NOT NEW.bukti_hash
+        BEGIN
+            DELETE FROM receipts WHERE hash = OLD.bukti_hash
+            AND NOT EXISTS (SELECT 1 FROM laporan_keuangan WHERE bukti_hash = OLD.bukti_hash);
+        END
+    """)
+
+
+def insert_receipt(cursor, content_hash, data):
+    cursor.execute("INSERT OR IGNORE INTO receipts (hash, mime, size, data) VALUES (?, ?, ?, ?)",
+                   (content_hash, images.image_mime(data), len(data), data))
+
+
+def _migration_007_riwayat_keyset_index(cursor):
+    # Riwayat pages through (tanggal, id) in descending order; with id in the index
+    # every page is a single index range scan, no temp B-tree for the ORDER BY.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_laporan_keuangan_user_tanggal_id
+        ON laporan_keuangan (username, tanggal, id)
+    """)
+    cursor.execute("ANALYZE laporan_keuangan")
+
+
+def _migration_008_user_id_keys(cursor):
+    # users mendapat surrogate key user_id; laporan_keuangan, target_anggaran,
+    # financial_targets (tabel lama) dan daily_summary menyimpan user_id dengan
+    # ON DELETE CASCADE. Ganti username hanya mengubah satu baris users, hapus akun
+    # cukup satu DELETE.
+    # SQLite tidak bisa mengubah PRIMARY KEY/FOREIGN KEY di tempat, jadi tabel dibangun ulang.
+    has_financial_targets = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'financial_targets'").fetchone() is not None
+    for trigger in ("trg_daily_summary_insert", "trg_daily_summary_delete", "trg_daily_summary_update",
+                    "trg_receipts_gc_delete", "trg_receipts_gc_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("ALTER TABLE users RENAME TO users_old")
+    cursor.execute("ALTER TABLE laporan_keuangan RENAME TO laporan_keuangan_old")
+    cursor.execute("ALTER TABLE target_anggaran RENAME TO target_anggaran_old")
+    if has_financial_targets:
+        cursor.execute("ALTER TABLE financial_targets RENAME TO financial_targets_old")
+    cursor.execute("DROP TABLE daily_summary")
+
+    # Columns this schema knows about get their new definition; any other column
+    # on the old table (e.g. daily_expense_threshold in older databases) is carried over as declared
+    user_columns = {
+        "username": "TEXT NOT NULL UNIQUE",
+        "password_hash": "TEXT NOT NULL",
+        "role": "TEXT DEFAULT 'user'",
+        "profile_pic": "BLOB",
+        "emergency_rate": "INTEGER DEFAULT 10",
+        "nama_akun": "TEXT",
+        "profile_pic_small": "BLOB",
+        "profile_pic_hash": "TEXT",
+    }
+    old_columns = cursor.execute("PRAGMA table_info(users_old)").fetchall()
+    for _, name, declared_type, not_null, default, _ in old_columns:
+        if name not in user_columns:
+            definition = declared_type or ""
+            if not_null:
+                definition += " NOT NULL"
+            if default is not None:
+                definition += f" DEFAULT {default}"
+            user_columns[name] = definition.strip()
+    copied_columns = [name for name in user_columns if name in {column[1] for column in old_columns}]
+    column_definitions = ",\n            ".join(f'"{name}" {definition}' for name, definition in user_columns.items())
+    cursor.execute(f"""
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            {column_definitions}
+        )
+    """)
+    column_list = ", ".join(f'"{name}"' for name in copied_columns)
+    cursor.execute(f"""
+        INSERT INTO users ({column_list})
+        SELECT {column_list} FROM users_old WHERE username IS NOT NULL ORDER BY rowid
+    """)
+    # Rows whose owner has no account (or no username) are kept under a locked account
+    financial_targets_owners = "UNION SELECT COALESCE(username, '') FROM financial_targets_old" if has_financial_targets else ""
+    orphans = [row[0] for row in cursor.execute(f"""
+        SELECT COALESCE(username, '') FROM laporan_keuangan_old
+        UNION SELECT COALESCE(username, '') FROM target_anggaran_old
+        {financial_targets_owners}
+        EXCEPT SELECT username FROM users
+    """).fetchall()]
+    if orphans:
+        import bcrypt
+
+        cursor.executemany("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                           [(username, bcrypt.hashpw(secrets.token_bytes(32), bcrypt.gensalt())) for username in orphans])
+
+    cursor.execute("""
+        CREATE TABLE laporan_keuangan (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            tanggal TEXT,
+            kategori TEXT,
+            jenis TEXT,
+            jumlah INTEGER,
+            dana_darurat INTEGER,
+            keterangan TEXT,
+            bukti_hash TEXT REFERENCES receipts(hash)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO laporan_keuangan (id, user_id, tanggal, kategori, jenis, jumlah, dana_darurat, keterangan, bukti_hash)
+        SELECT old.id, users.user_id, old.tanggal, old.kategori, old.jenis, old.jumlah, old.dana_darurat, old.keterangan,
+               (SELECT hash FROM receipts WHERE hash = old.bukti_hash)
+        FROM laporan_keuangan_old AS old JOIN users ON users.username = COALESCE(old.username, '')
+    """)
+    # Keep AUTOINCREMENT from handing out ids of rows deleted before the migration
+    cursor.execute("""
+        UPDATE sqlite_sequence SET seq = MAX(seq, (SELECT seq FROM sqlite_sequence WHERE name = 'laporan_keuangan_old'))
+        WHERE name = 'laporan_keuangan' AND EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'laporan_keuangan_old')
+    """)
+
+    cursor.execute("""
+        CREATE TABLE target_anggaran (
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            bulan TEXT,
+            tahun INTEGER,
+            target_pengeluaran INTEGER,
+            target_tabungan INTEGER,
+            target_investasi INTEGER,
+            PRIMARY KEY (user_id, bulan, tahun)
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO target_anggaran (user_id, bulan, tahun, target_pengeluaran, target_tabungan, target_investasi)
+        SELECT users.user_id, old.bulan, old.tahun, old.target_pengeluaran, old.target_tabungan, old.target_investasi
+        FROM target_anggaran_old AS old JOIN users ON users.username = COALESCE(old.username, '')
+    """)
+
+    if has_financial_targets:
+        cursor.execute("""
+            CREATE TABLE financial_targets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+                target_name TEXT NOT NULL,
+                target_amount INTEGER NOT NULL,
+                target_month TEXT NOT NULL, -- YYYY-MM format
+                target_type TEXT NOT NULL, -- e.g., 'income', 'expense'
+                UNIQUE (user_id, target_name, target_month, target_type)
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO financial_targets (id, user_id, target_name, target_amount, target_month, target_type)
+            SELECT old.id, users.user_id, old.target_name, old.target_amount, old.target_month, old.target_type
+            FROM financial_targets_old AS old JOIN users ON users.username = COALESCE(old.username, '')
+        """)
+        cursor.execute("DROP TABLE financial_targets_old")
+
+    cursor.execute("DROP TABLE laporan_keuangan_old")
+    cursor.execute("DROP TABLE target_anggaran_old")
+    cursor.execute("DROP TABLE users_old")
+
+    cursor.execute("""
+        CREATE TABLE daily_summary (
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            tanggal TEXT NOT NULL,
+            jenis TEXT NOT NULL,
+            kategori TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            dana_darurat INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, tanggal, jenis, kategori)
+        ) WITHOUT ROWID
+    """)
+    # Same indexes as migrations 002, 006 and 007, now on the integer key
+    cursor.execute("""
+        CREATE INDEX idx_laporan_keuangan_user_tanggal
+        ON laporan_keuangan (user_id, tanggal, jenis, kategori, jumlah)
+    """)
+    cursor.execute("CREATE INDEX idx_laporan_keuangan_user_tanggal_id ON laporan_keuangan (user_id, tanggal, id)")
+    cursor.execute("""
+        CREATE INDEX idx_laporan_keuangan_bukti_hash
+        ON laporan_keuangan (bukti_hash) WHERE bukti_hash IS NOT NULL
+    """)
+    create_rollup_triggers(cursor)
+    create_receipt_gc_triggers(cursor)
+    rebuild_daily_summary(cursor)
+    cursor.execute("ANALYZE")
+
+
+def _migration_009_epoch_day_dates(cursor):
+    # tanggal menjadi INTEGER hari sejak 1970-01-01 (lihat dates.py), dijaga CHECK
+    # sehingga tidak ada lagi teks tanggal yang harus di-parse saat dimuat.
+    # date() menormalkan 'YYYY-MM-DD' maupun 'YYYY-MM-DD HH:MM:SS' ke tengah malam.
+    # Baris lama yang tanggalnya kosong/tidak valid tidak pernah tampil di aplikasi;
+    # baris itu dipindahkan apa adanya ke laporan_keuangan_tanggal_invalid.
+    epoch_days = "CAST(julianday(date(tanggal)) - 2440587.5 AS INTEGER)"
+    for trigger in ("trg_daily_summary_insert", "trg_daily_summary_delete", "trg_daily_summary_update",
+                    "trg_receipts_gc_delete", "trg_receipts_gc_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("ALTER TABLE laporan_keuangan RENAME TO laporan_keuangan_old")
+    cursor.execute("DROP TABLE daily_summary")
+
+    if cursor.execute("SELECT 1 FROM laporan_keuangan_old WHERE date(tanggal) IS NULL LIMIT 1").fetchone():
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS laporan_keuangan_tanggal_invalid AS
+            SELECT * FROM laporan_keuangan_old WHERE 0
+        """)
+        cursor.execute("INSERT INTO laporan_keuangan_tanggal_invalid SELECT * FROM laporan_keuangan_old WHERE date(tanggal) IS NULL")
+
+    cursor.execute("""
+        CREATE TABLE laporan_keuangan (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            tanggal INTEGER NOT NULL CHECK (typeof(tanggal) = 'integer'),
+            kategori TEXT,
+            jenis TEXT,
+            jumlah INTEGER,
+            dana_darurat INTEGER,
+            keterangan TEXT,
+            bukti_hash TEXT REFERENCES receipts(hash)
+        )
+    """)
+    cursor.execute(f"""
+        INSERT INTO laporan_keuangan (id, user_id, tanggal, kategori, jenis, jumlah, dana_darurat, keterangan, bukti_hash)
+        SELECT id, user_id, {epoch_days}, kategori, jenis, jumlah, dana_darurat, keterangan, bukti_hash
+        FROM laporan_keuangan_old WHERE date(tanggal) IS NOT NULL
+    """)
+    cursor.execute("""
+        UPDATE sqlite_sequence SET seq = MAX(seq, (SELECT seq FROM sqlite_sequence WHERE name = 'laporan_keuangan_old'))
+        WHERE name = 'laporan_keuangan' AND EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'laporan_keuangan_old')
+    """)
+    cursor.execute("DROP TABLE laporan_keuangan_old")
+
+    cursor.execute("""
+        CREATE TABLE daily_summary (
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            tanggal INTEGER NOT NULL,
+            jenis TEXT NOT NULL,
+            kategori TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            dana_darurat INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, tanggal, jenis, kategori)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_laporan_keuangan_user_tanggal
+        ON laporan_keuangan (user_id, tanggal, jenis, kategori, jumlah)
+    """)
+    cursor.execute("CREATE INDEX idx_laporan_keuangan_user_tanggal_id ON laporan_keuangan (user_id, tanggal, id)")
+    cursor.execute("""
+        CREATE INDEX idx_laporan_keuangan_bukti_hash
+        ON laporan_keuangan (bukti_hash) WHERE bukti_hash IS NOT NULL
+    """)
+    create_rollup_triggers(cursor)
+    create_receipt_gc_triggers(cursor)
+    rebuild_daily_summary(cursor)
+    cursor.execute("ANALYZE")
+
+
+MIGRATIONS = [
+    _migration_001_base_schema,
+    _migration_002_ledger_indexes,
+    _migration_003_lowercase_jenis,
+    _migration_004_daily_summary,
+    _migration_005_avatar_thumbnails,
+    _migration_006_receipt_store,
+    _migration_007_riwayat_keyset_index,
+    _migration_008_user_id_keys,
+    _migration_009_epoch_day_dates,
+]
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    for version, step in enumerate(MIGRATIONS, start=1):
+        if cursor.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another process (e.g. `python database.py migrate`
+            # while the server starts) may have applied this step while we waited for it
+            if cursor.execute("PRAGMA user_version").fetchone()[0] < version:
+                step(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    return len(MIGRATIONS)
+
+
+@st.cache_resource(show_spinner=False)
+def initialize_db():
+    # Cached per process: the schema check runs once, not on every rerun
+    with connection() as conn:
+        return migrate(conn)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Perawatan database Xpense")
+    parser.add_argument("--db", default=DB_NAME, help="Path file SQLite (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Jalankan migrasi skema yang belum diterapkan")
+    rebuild_parser = subparsers.add_parser("rebuild-daily-summary", help="Bangun ulang tabel daily_summary")
+    rebuild_parser.add_argument("--user", help="Hanya bangun ulang rollup untuk username ini")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db)
+    conn = pool.acquire()
+    try:
+        migrate(conn)
+        if args.command == "rebuild-daily-summary":
+            conn.execute("BEGIN IMMEDIATE")
+            user_id = None
+            if args.user is not None:
+                row = conn.execute("SELECT user_id FROM users WHERE username = ?", (args.user,)).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    raise SystemExit(f"Username {args.user} tidak ditemukan.")
+                user_id = row[0]
+            rebuild_daily_summary(conn.cursor(), user_id)
+            conn.execute("COMMIT")
+            print("daily_summary berhasil dibangun ulang.")
+    finally:
+        pool.release(conn)
+        pool.close_all()
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# --- Penyimpanan Tanggal ---
+# Sejak migrasi 009 kolom tanggal disimpan sebagai INTEGER: jumlah hari sejak
+# 1970-01-01 (epoch days). Di SQLite perbandingan dan rentang jadi perbandingan
+# integer biasa di index; saat dimuat, kolom int64 langsung dibaca ulang sebagai
+# datetime64 tanpa parsing string.
+EPOCH = date(1970, 1, 1)
+
+
+def to_epoch_days(value):
+    """``date`` -> days since 1970-01-01, the value stored in ``tanggal``."""
+    return (value - EPOCH).days
+
+
+def from_epoch_days(days):
+    return EPOCH + timedelta(days=int(days))
+
+
+def epoch_days_to_datetime(days):
+    # Converter for loaded columns: reinterpret the integers as datetime64[D], no string parsing
+    return pd.Series(np.asarray(days, dtype="int64").astype("datetime64[D]"), index=getattr(days, "index", None),
+                     name=getattr(days, "name", None)).astype("datetime64[ns]")
+
+
+def datetime_to_epoch_days(values):
+    # Inverse converter, for vectorized writes (import, benchmark); keeps the local calendar date
+    values = pd.DatetimeIndex(values)
+    if values.tz is not None:
+        values = values.tz_localize(None)
+    return values.to_numpy(dtype="datetime64[D]").astype("int64")
+
+
+def year_range(year):
+    """Half-open ``[start, end)`` epoch-day range of a calendar year."""
+    return to_epoch_days(date(year, 1, 1)), to_epoch_days(date(year + 1, 1, 1))
+
+
+def month_range(year, month):
+    """Half-open ``[start, end)`` epoch-day range of one month."""
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return to_epoch_days(date(year, month, 1)), to_epoch_days(end)
@@ -0,0 +1,158 @@
+import io
+import tempfile
+import zipfile
+
+import pandas as pd
+
+import dates
+from database import connection
+
+# --- Export Riwayat ---
+# Baris ledger dialirkan dari SQLite lewat generator per potongan tetap dan
+# langsung ditulis ke file sementara (SpooledTemporaryFile, pindah ke disk jika
+# besar), jadi memori tidak bertambah mengikuti panjang histori. BLOB bukti
+# hanya dibaca jika diminta, satu per satu, langsung ke dalam ZIP.
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_COLUMNS = ["id", "tanggal", "jenis", "kategori", "jumlah", "dana_darurat", "keterangan"]
+# Files up to this size stay in memory; larger exports spill to a temp file
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel (XLSX)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+# Arrow type per exported column, used by the Parquet writer
+PARQUET_TYPES = {
+    "id": "int64",
+    "tanggal": "timestamp[ns]",
+    "jenis": "string",
+    "kategori": "string",
+    "jumlah": "int64",
+    "dana_darurat": "int64",
+    "keterangan": "string",
+    "bukti": "string",
+}
+RECEIPT_EXTENSIONS = {"image/webp": "webp", "image/jpeg": "jpg", "image/png": "png"}
+RECEIPT_DIR = "bukti"
+
+
+def iter_ledger_chunks(user_id, ledger_filter, include_receipts=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the filtered ledger as DataFrames of at most ``chunk_size`` rows, oldest first.
+
+    Receipts are never read here; with ``include_receipts`` each row carries
+    the path its receipt gets inside the export ZIP.
+    """
+    where, params = ledger_filter.where_clause()
+    # receipts shares no column names with laporan_keuangan, so the filter needs no table prefix
+    receipt_columns = ", bukti_hash, mime" if include_receipts else ""
+    receipt_join = "LEFT JOIN receipts ON receipts.hash = laporan_keuangan.bukti_hash" if include_receipts else ""
+    with connection() as conn:
+        cursor = conn.execute(f"""
+            SELECT {', '.join(EXPORT_COLUMNS)}{receipt_columns}
+            FROM laporan_keuangan {receipt_join}
+            WHERE user_id = ? AND {where}
+            ORDER BY tanggal, id
+        """, (user_id, *params))
+        columns = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            # Epoch days -> real dates, so CSV/XLSX/Parquet carry a date, not a day count
+            chunk["tanggal"] = dates.epoch_days_to_datetime(chunk["tanggal"])
+            if include_receipts:
+                extension = chunk.pop("mime").map(RECEIPT_EXTENSIONS).fillna("png")
+                bukti_hash = chunk.pop("bukti_hash")
+                chunk["bukti"] = (RECEIPT_DIR + "/" + bukti_hash.fillna("") + "." + extension).where(bukti_hash.notna())
+            yield chunk
+
+
+def _write_csv(chunks, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(text, index=False, header=header)
+        header = False
+    text.detach()  # keep ``out`` open for the caller
+
+
+def _write_parquet(chunks, out):
+    # pyarrow comes with Streamlit; imported here so CSV/XLSX exports don't pay for it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Explicit schema: a column that is all-null in the first chunk (bukti, keterangan)
+    # would otherwise be inferred as type null and reject later chunks
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.schema([(column, PARQUET_TYPES[column]) for column in chunk.columns])
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        if writer is None:
+            # Empty filter result: still a valid file with the ledger columns
+            writer = pq.ParquetWriter(out, pa.schema([(column, PARQUET_TYPES[column]) for column in EXPORT_COLUMNS]))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(chunks, out):
+    # Optional dependency: only needed for Excel exports
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)  # rows are streamed to disk, not kept as cell objects
+    sheet = workbook.create_sheet("Riwayat")
+    header = True
+    for chunk in chunks:
+        if header:
+            sheet.append(list(chunk.columns))
+            header = False
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(out)
+
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}
+
+
+def iter_receipts(user_id, ledger_filter):
+    """Yield ``(path inside the ZIP, data)`` for every distinct receipt in the filtered ledger, one BLOB at a time."""
+    where, params = ledger_filter.where_clause()
+    with connection() as conn:
+        hashes = [row[0] for row in conn.execute(f"""
+            SELECT DISTINCT bukti_hash FROM laporan_keuangan
+            WHERE user_id = ? AND bukti_hash IS NOT NULL AND {where}
+        """, (user_id, *params))]
+        for content_hash in hashes:
+            row = conn.execute("SELECT mime, data FROM receipts WHERE hash = ?", (content_hash,)).fetchone()
+            if row is not None:
+                mime, data = row
+                yield f"{RECEIPT_DIR}/{content_hash}.{RECEIPT_EXTENSIONS.get(mime, 'png')}", data
+
+
+def export_ledger(user_id, ledger_filter, file_format, include_receipts=False):
+    """Write the filtered ledger to a spooled temp file; returns ``(file, file_name, mime)``.
+
+    With ``include_receipts`` the result is a ZIP holding the ledger file and
+    a ``bukti/`` folder with every referenced receipt.
+    """
+    extension, mime = file_format
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    chunks = iter_ledger_chunks(user_id, ledger_filter, include_receipts)
+    if not include_receipts:
+        WRITERS[extension](chunks, out)
+        out.seek(0)
+        return out, f"riwayat_xpense.{extension}", mime
+
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(f"riwayat_xpense.{extension}", "w", force_zip64=True) as ledger_file:
+            WRITERS[extension](chunks, ledger_file)
+        for path, data in iter_receipts(user_id, ledger_filter):
+            # Receipts are already WebP/JPEG: storing them uncompressed saves CPU for nothing lost
+            archive.writestr(path, data, compress_type=zipfile.ZIP_STORED)
+    out.seek(0)
+    return out, "riwayat_xpense.zip", "application/zip"
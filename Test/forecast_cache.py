@@ -0,0 +1,134 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import streamlit as st
+
+# --- Forecast Cache ---
+# Hasil forecasting disimpan di disk, dikunci dengan sidik jari deret ds/y,
+# konfigurasi seasonality, horizon dan label data. Cache dipakai bersama oleh
+# semua sesi dan tetap ada setelah server restart; entri yang paling lama
+# tidak dipakai dibuang saat batas jumlah/ukuran terlampaui.
+CACHE_DIR = os.path.join(".xpense_cache", "forecasts")
+MAX_ENTRIES = 500
+MAX_BYTES = 200 * 1024 * 1024
+
+# Naikkan jika cara fitting berubah, agar hasil lama tidak terpakai lagi
+CACHE_VERSION = 1
+
+# State model Prophet per user/per seri (parameter hasil fit + cutoff training),
+# dipakai untuk warm-start saat hanya beberapa hari baru yang ditambahkan.
+MODEL_STATE_DIR = os.path.join(".xpense_cache", "models")
+MODEL_STATE_MAX_ENTRIES = 2000
+MODEL_STATE_MAX_BYTES = 50 * 1024 * 1024
+
+
+def series_digest(df_for_forecast):
+    digest = hashlib.sha256()
+    digest.update(df_for_forecast["ds"].to_numpy(dtype="datetime64[ns]").tobytes())
+    digest.update(df_for_forecast["y"].to_numpy(dtype="float64").tobytes())
+    return digest
+
+
+def model_state_key(user_id, data_type_label, profile, series_start):
+    # The series start is part of the key so dashboard filters don't overwrite the full-history state
+    raw = json.dumps([user_id, data_type_label, profile, str(series_start)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def fingerprint(df_for_forecast, seasonalities, forecast_periods, data_type_label, **settings):
+    digest = series_digest(df_for_forecast)
+    digest.update(json.dumps({
+        "version": CACHE_VERSION,
+        "seasonalities": seasonalities,
+        "periods": forecast_periods,
+        "label": data_type_label,
+        "settings": settings,
+    }, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class ForecastCache:
+    def __init__(self, directory=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Corrupt or written by an incompatible version: treat as a miss
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        # Write to a temp file first so concurrent readers never see a partial pickle
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    def clear(self):
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pkl"):
+                    self._remove(entry.path)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, path = entries.pop(0)
+                self._remove(path)
+                total_bytes -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_forecast_cache():
+    return ForecastCache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_model_state_store():
+    # Plain per-process singleton: forecast worker processes read and write it outside Streamlit
+    return ForecastCache(MODEL_STATE_DIR, max_entries=MODEL_STATE_MAX_ENTRIES, max_bytes=MODEL_STATE_MAX_BYTES)
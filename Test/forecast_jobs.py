@@ -0,0 +1,166 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import streamlit as st
+
+import forecast_cache
+import forecasting
+
+# --- Forecast Job Executor ---
+# Fitting Prophet berjalan di process pool terbatas, bukan di thread script
+# Streamlit. Sesi hanya menyimpan job id dan mem-poll statusnya, sehingga UI
+# tetap responsif dan beberapa user bisa forecasting paralel di core berbeda.
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_JOBS_PER_USER = 2
+MAX_QUEUED_JOBS = 32
+# Finished jobs are kept this long so the session can still pick up the result
+FINISHED_JOB_TTL_SECONDS = 15 * 60
+
+
+class TooManyJobsError(RuntimeError):
+    pass
+
+
+@dataclass
+class JobStatus:
+    state: str                      # "pending", "running", "done", "error", "cancelled"
+    elapsed: float
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class _Job:
+    def __init__(self, user_id, request, future, group):
+        self.user_id = user_id
+        self.request = request
+        self.future = future
+        self.group = group  # jobs submitted together count once against the per-user limit
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.superseded = False
+
+
+class ForecastJobExecutor:
+    def __init__(self, result_cache, max_workers=MAX_WORKERS, max_jobs_per_user=MAX_JOBS_PER_USER):
+        # Finished results are written from the pool's callback thread, which has no
+        # Streamlit script context: the cache instance is handed in, never looked up there
+        self.result_cache = result_cache
+        self.max_workers = max_workers
+        self.max_jobs_per_user = max_jobs_per_user
+        self._pool = None
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: never fork the multi-threaded Streamlit server
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _active_jobs(self, user_id=None):
+        return [job for job in self._jobs.values()
+                if not job.future.done() and (user_id is None or job.user_id == user_id)]
+
+    def _prune(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > FINISHED_JOB_TTL_SECONDS:
+                del self._jobs[job_id]
+
+    def submit(self, user_id, request, supersedes=None):
+        """Queue ``request`` and return its job id.
+
+        ``supersedes`` is the caller's previous job id; it is cancelled (or, if
+        already running, its result is discarded) once the new job is accepted.
+        """
+        return self.submit_batch(user_id, [request], supersedes=[supersedes])[0]
+
+    def submit_batch(self, user_id, requests, supersedes=()):
+        """Queue several requests at once so they fit in parallel; returns their job ids in order.
+
+        The batch counts as one job against ``max_jobs_per_user``. ``supersedes``
+        is an iterable of previous job ids to cancel once the limits allow the
+        new batch; if they don't, the previous jobs keep running untouched.
+        """
+        with self._lock:
+            self._prune()
+            replaced = [self._jobs[job_id] for job_id in supersedes if job_id in self._jobs]
+            # Pending jobs about to be cancelled free their slot; running ones hold it until they finish
+            freed = [job for job in replaced if not job.future.running()]
+            active_jobs = [job for job in self._active_jobs() if job not in freed]
+            active_groups = {job.group for job in active_jobs if job.user_id == user_id}
+            if len(active_groups) >= self.max_jobs_per_user:
+                raise TooManyJobsError("Masih ada forecasting Anda yang sedang berjalan. Tunggu sebentar lalu coba lagi.")
+            if len(active_jobs) + len(requests) > MAX_QUEUED_JOBS:
+                raise TooManyJobsError("Server sedang sibuk memproses forecasting lain. Coba lagi sebentar lagi.")
+            for job in replaced:
+                self._supersede(job)
+
+            group = object()
+            jobs = []
+            for request in requests:
+                try:
+                    future = self._get_pool().submit(forecasting.compute_forecast, request)
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM); start a fresh pool and retry once
+                    self._pool = None
+                    future = self._get_pool().submit(forecasting.compute_forecast, request)
+
+                job_id = next(self._ids)
+                job = _Job(user_id, request, future, group)
+                self._jobs[job_id] = job
+                jobs.append((job_id, job))
+        for job_id, job in jobs:
+            job.future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+        return [job_id for job_id, job in jobs]
+
+    def _on_done(self, job, future):
+        job.finished_at = time.monotonic()
+        if future.cancelled() or future.exception() is not None:
+            return
+        # Cache even superseded results: the next identical request becomes a hit
+        self.result_cache.put(job.request.key, future.result())
+
+    def _supersede(self, job):
+        job.superseded = True
+        job.future.cancel()  # no-op once the worker has started
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._supersede(job)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return JobStatus("cancelled", 0.0, error="Job tidak ditemukan atau sudah kedaluwarsa.")
+
+        end = job.finished_at if job.finished_at is not None else time.monotonic()
+        elapsed = end - job.submitted_at
+        if job.superseded:
+            return JobStatus("cancelled", elapsed)
+        future = job.future
+        if not future.done():
+            return JobStatus("running" if future.running() else "pending", elapsed)
+        try:
+            return JobStatus("done", elapsed, result=future.result())
+        except CancelledError:
+            return JobStatus("cancelled", elapsed)
+        except Exception as e:
+            return JobStatus("error", elapsed, error=str(e))
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    return ForecastJobExecutor(forecast_cache.get_forecast_cache())
@@ -0,0 +1,407 @@
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+import plotly.graph_objects as go
+
+import forecast_cache
+import holt_winters
+
+# --- Forecasting ---
+FORECAST_TYPES = {
+    "Pendapatan": "pendapatan",
+    "Pengeluaran": "pengeluaran",
+    "Keuntungan (Pendapatan - Pengeluaran)": "keuntungan",
+}
+
+FORECAST_ENGINES = {
+    "Otomatis": "auto",
+    "Prophet": "prophet",
+    "Holt-Winters (cepat)": "holt_winters",
+}
+ENGINE_LABELS = {engine: label for label, engine in FORECAST_ENGINES.items()}
+
+# Prophet fitting-cost profiles. Most of the server time goes to predict()'s
+# uncertainty sampling, so the cheaper profiles cut that first; "accurate"
+# matches Prophet's own defaults (the behaviour before profiles existed): it sets
+# no algorithm, so Prophet keeps choosing Newton below 100 points and LBFGS above.
+PROPHET_PROFILES = {
+    "fast": {
+        "uncertainty_samples": 100,
+        "algorithm": "LBFGS",
+        "iter": 500,
+        "n_changepoints": 10,
+        "weekly_fourier_order": 2,
+        "yearly_fourier_order": 5,
+    },
+    "balanced": {
+        "uncertainty_samples": 300,
+        "algorithm": "LBFGS",
+        "iter": 2000,
+        "n_changepoints": 20,
+        "weekly_fourier_order": 3,
+        "yearly_fourier_order": 8,
+    },
+    "accurate": {
+        "uncertainty_samples": 1000,
+        "iter": 10000,
+        "n_changepoints": 25,
+        "weekly_fourier_order": 3,
+        "yearly_fourier_order": 10,
+    },
+}
+PROFILE_LABELS = {"Cepat": "fast", "Seimbang": "balanced", "Akurat": "accurate"}
+DEFAULT_PROFILE = "balanced"
+
+# Warm-start policy: a refit reuses the previous fit's parameters as the optimizer's
+# starting point only when a few days were appended and the old forecast still held
+WARM_START_MAX_NEW_DAYS = 31
+WARM_START_MAX_NEW_FRACTION = 0.1   # appended rows / previously fitted rows
+WARM_START_MAX_CONSECUTIVE = 20     # force a full refit now and then
+DRIFT_MAX_OUTSIDE_FRACTION = 0.5    # new points outside the previous interval
+
+# Histories below these limits go to the NumPy Holt-Winters forecaster in "auto" mode
+LIGHTWEIGHT_MAX_SPAN_DAYS = 90
+LIGHTWEIGHT_MAX_POINTS = 60
+LIGHTWEIGHT_MIN_DENSITY = 0.3  # observed days / calendar days
+
+
+def build_forecast_series(daily_df, forecast_type):
+    """Turn per-(tanggal, jenis) totals into the ``ds``/``y`` frame Prophet expects."""
+    data_type_label = FORECAST_TYPES[forecast_type]
+
+    if data_type_label in ("pendapatan", "pengeluaran"):
+        df_for_forecast = daily_df[daily_df["jenis"] == data_type_label][["tanggal", "jumlah"]].reset_index(drop=True)
+    else:
+        df_pendapatan_daily_df = daily_df[daily_df["jenis"] == "pendapatan"][["tanggal", "jumlah"]]
+        df_pengeluaran_daily_df = daily_df[daily_df["jenis"] == "pengeluaran"][["tanggal", "jumlah"]]
+
+        # Merge to get all dates and corresponding amounts
+        merged_df = pd.merge(df_pendapatan_daily_df, df_pengeluaran_daily_df,
+                             on='tanggal', how='outer', suffixes=('_pendapatan', '_pengeluaran'))
+
+        # Fill NaN values with 0
+        merged_df = merged_df.fillna(0)
+
+        # Calculate net amount
+        merged_df['jumlah'] = merged_df['jumlah_pendapatan'] - merged_df['jumlah_pengeluaran']
+
+        df_for_forecast = merged_df[['tanggal', 'jumlah']]
+
+    df_for_forecast = df_for_forecast.rename(columns={"tanggal": "ds", "jumlah": "y"})  # Rename columns for Prophet
+    df_for_forecast["ds"] = pd.to_datetime(df_for_forecast["ds"]) # Ensure 'ds' is datetime
+    df_for_forecast["y"] = df_for_forecast["y"].astype(float)
+    return df_for_forecast.sort_values("ds").reset_index(drop=True), data_type_label
+
+
+def build_batch_series(rollup_df, kategori_pengeluaran):
+    """All batch series from one groupby over the rollup: the three totals plus one per expense kategori.
+
+    Returns ``{display label: (ds/y frame, data_type_label)}`` in display order.
+    """
+    grouped = rollup_df.groupby(["tanggal", "jenis", "kategori"])["jumlah"].sum()
+    per_jenis = grouped.groupby(level=["tanggal", "jenis"]).sum().unstack("jenis")
+    per_jenis = per_jenis.reindex(columns=["pendapatan", "pengeluaran"])
+
+    columns = {
+        "Pendapatan": (per_jenis["pendapatan"], "pendapatan"),
+        "Pengeluaran": (per_jenis["pengeluaran"], "pengeluaran"),
+        # Same as build_forecast_series: missing side of a day counts as 0
+        "Keuntungan": (per_jenis["pendapatan"].fillna(0) - per_jenis["pengeluaran"].fillna(0), "keuntungan"),
+    }
+    if "pengeluaran" in grouped.index.get_level_values("jenis"):
+        per_kategori = grouped.xs("pengeluaran", level="jenis").unstack("kategori")
+    else:
+        per_kategori = pd.DataFrame(index=per_jenis.index)
+    per_kategori = per_kategori.reindex(columns=kategori_pengeluaran)
+    for kategori in kategori_pengeluaran:
+        columns[f"Pengeluaran: {kategori}"] = (per_kategori[kategori], f"pengeluaran {kategori}")
+
+    batch = {}
+    for label, (values, data_type_label) in columns.items():
+        values = values.dropna()
+        df_for_forecast = pd.DataFrame({"ds": pd.to_datetime(values.index), "y": values.to_numpy(dtype=float)})
+        batch[label] = (df_for_forecast.sort_values("ds").reset_index(drop=True), data_type_label)
+    return batch
+
+
+def seasonality_config(df_for_forecast, profile=DEFAULT_PROFILE):
+    # Add seasonality if data duration is sufficient
+    settings = PROPHET_PROFILES[profile]
+    span_days = (df_for_forecast['ds'].max() - df_for_forecast['ds'].min()).days
+    config = {}
+    if span_days >= 365 * 2: # At least 2 years for yearly
+        config["yearly"] = {"period": 365.25, "fourier_order": settings["yearly_fourier_order"]}
+    if span_days >= 7 * 2: # At least 2 weeks for weekly
+        config["weekly"] = {"period": 7, "fourier_order": settings["weekly_fourier_order"]}
+    return config
+
+
+def choose_engine(df_for_forecast):
+    span_days = (df_for_forecast['ds'].max() - df_for_forecast['ds'].min()).days + 1
+    density = len(df_for_forecast) / span_days
+    if (span_days < LIGHTWEIGHT_MAX_SPAN_DAYS or len(df_for_forecast) < LIGHTWEIGHT_MAX_POINTS
+            or density < LIGHTWEIGHT_MIN_DENSITY):
+        return "holt_winters"
+    return "prophet"
+
+
+def warm_start_init(state, df_for_forecast, config):
+    """Previous fitted parameters if ``df_for_forecast`` only appends to the state's history, else None."""
+    if state is None or state["config"] != config or state["warm_starts"] >= WARM_START_MAX_CONSECUTIVE:
+        return None
+
+    cutoff = state["cutoff"]
+    history = df_for_forecast[df_for_forecast["ds"] <= cutoff]
+    # Edited or deleted past transactions change the prefix: refit from scratch
+    if len(history) != state["n_rows"] or forecast_cache.series_digest(history).hexdigest() != state["history_digest"]:
+        return None
+
+    appended = df_for_forecast[df_for_forecast["ds"] > cutoff]
+    if appended.empty:
+        return state["init"]
+    if ((appended["ds"].max() - cutoff).days > WARM_START_MAX_NEW_DAYS
+            or len(appended) > len(history) * WARM_START_MAX_NEW_FRACTION):
+        return None
+
+    # Drift: most new observations fell outside the interval the previous fit predicted
+    checked = appended.merge(state["forecast"], on="ds")
+    if not checked.empty:
+        outside = (checked["y"] < checked["yhat_lower"]) | (checked["y"] > checked["yhat_upper"])
+        if outside.mean() > DRIFT_MAX_OUTSIDE_FRACTION:
+            return None
+    return state["init"]
+
+
+def fit_prophet(df_for_forecast, forecast_periods, seasonalities, profile=DEFAULT_PROFILE, warm_state=None):
+    """Fit Prophet with the given cost profile; returns ``(forecast, timings, model_state)``.
+
+    ``warm_state`` is the ``model_state`` of an earlier fit of the same series;
+    see ``warm_start_init`` for when it is used.
+    """
+    # Imported here so sessions that never forecast with Prophet skip the Prophet/cmdstanpy import
+    from prophet import Prophet
+
+    settings = PROPHET_PROFILES[profile]
+    config = {"profile": profile, "seasonalities": seasonalities}
+
+    def new_model():
+        model = Prophet(uncertainty_samples=settings["uncertainty_samples"],
+                        n_changepoints=settings["n_changepoints"])
+        for name, params in seasonalities.items():
+            model.add_seasonality(name=name, **params)
+        return model
+
+    # Create and fit the model
+    fit_args = {key: settings[key] for key in ("algorithm", "iter") if key in settings}
+    init = warm_start_init(warm_state, df_for_forecast, config)
+    started = time.perf_counter()
+    model = None
+    if init is not None:
+        try:
+            model = new_model()
+            model.fit(df_for_forecast, init=init, **fit_args)
+        except Exception:
+            # e.g. fewer changepoints on a short history changed the parameter shapes
+            model = None
+            init = None
+    if model is None:
+        model = new_model()
+        model.fit(df_for_forecast, **fit_args)
+    fitted = time.perf_counter()
+
+    # Create future dates for forecasting
+    future = model.make_future_dataframe(periods=forecast_periods)  # Use selected periods
+    forecast = model.predict(future)
+    predicted = time.perf_counter()
+    timings = {"fit": fitted - started, "predict": predicted - fitted, "warm_start": init is not None}
+
+    # Same shape as Prophet's documented stan_init(): scalars for k/m/sigma_obs, vectors for delta/beta
+    fitted_params = {name: model.params[name][0][0] for name in ("k", "m", "sigma_obs")}
+    fitted_params.update({name: model.params[name][0] for name in ("delta", "beta")})
+    cutoff = df_for_forecast["ds"].max()
+    model_state = {
+        "config": config,
+        "init": fitted_params,
+        "cutoff": cutoff,
+        "n_rows": len(df_for_forecast),
+        "history_digest": forecast_cache.series_digest(df_for_forecast).hexdigest(),
+        "warm_starts": warm_state["warm_starts"] + 1 if init is not None else 0,
+        "forecast": forecast.loc[forecast["ds"] > cutoff, ["ds", "yhat_lower", "yhat_upper"]],
+    }
+    return forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]], timings, model_state
+
+
+@dataclass(frozen=True)
+class ForecastRequest:
+    """Everything needed to fit one forecast; picklable so it can go to a worker process."""
+    df_for_forecast: pd.DataFrame = field(compare=False)
+    forecast_periods: int
+    data_type_label: str
+    seasonalities: dict = field(compare=False)
+    engine: str
+    profile: str
+    key: str
+    # Where the fitted Prophet state for this user's series lives (None: no warm start)
+    state_key: Optional[str] = field(default=None, compare=False)
+
+
+def make_request(df_for_forecast, forecast_periods, data_type_label, engine="auto", profile=DEFAULT_PROFILE,
+                 user_id=None):
+    if engine == "auto":
+        engine = choose_engine(df_for_forecast)
+    seasonalities = seasonality_config(df_for_forecast, profile)
+    # The profile only changes Prophet fits; Holt-Winters results are shared across profiles
+    settings = {"engine": engine, "profile": profile if engine == "prophet" else None}
+    key = forecast_cache.fingerprint(df_for_forecast, seasonalities, forecast_periods, data_type_label, **settings)
+    state_key = None
+    if user_id is not None and engine == "prophet":
+        state_key = forecast_cache.model_state_key(user_id, data_type_label, profile, df_for_forecast["ds"].min())
+    return ForecastRequest(df_for_forecast, forecast_periods, data_type_label, seasonalities, engine, profile, key,
+                           state_key)
+
+
+def cached_forecast(request):
+    return forecast_cache.get_forecast_cache().get(request.key)
+
+
+def compute_forecast(request):
+    # Runs in a worker process (see forecast_jobs.py): must not touch Streamlit
+    if request.engine == "holt_winters":
+        started = time.perf_counter()
+        forecast = holt_winters.forecast(request.df_for_forecast, request.forecast_periods)
+        # Holt-Winters fits and forecasts in one pass
+        timings = {"fit": time.perf_counter() - started, "predict": 0.0}
+    else:
+        states = forecast_cache.get_model_state_store()
+        warm_state = states.get(request.state_key) if request.state_key else None
+        forecast, timings, model_state = fit_prophet(request.df_for_forecast, request.forecast_periods,
+                                                     request.seasonalities, request.profile, warm_state)
+        if request.state_key:
+            states.put(request.state_key, model_state)
+    return {
+        "forecast": forecast,
+        "insights": generate_forecasting_insights(forecast, request.forecast_periods, request.data_type_label),
+        "timings": timings,
+    }
+
+
+def run_forecast(request):
+    """Synchronous path: cached result if any, otherwise fit in this process and cache it."""
+    result = cached_forecast(request)
+    if result is None:
+        result = compute_forecast(request)
+        forecast_cache.get_forecast_cache().put(request.key, result)
+    return result
+
+
+def plot_forecast(df_for_forecast, forecast):
+    # Same visual language as Prophet's own plot: dark blue yhat, light blue interval, black history
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat_upper"], mode="lines",
+                             line=dict(width=0), showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat_lower"], mode="lines", line=dict(width=0),
+                             fill="tonexty", fillcolor="rgba(0, 114, 178, 0.2)", name="Rentang ketidakpastian"))
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat"], mode="lines",
+                             line=dict(color="#0072B2", width=2), name="Prediksi (yhat)"))
+    fig.add_trace(go.Scatter(x=df_for_forecast["ds"], y=df_for_forecast["y"], mode="markers",
+                             marker=dict(color="black", size=4), name="Data historis"))
+    fig.update_layout(height=450, margin=dict(l=20, r=20, t=40, b=20),
+                      xaxis_title="Tanggal", yaxis_title="Jumlah")
+    return fig
+
+
+def plot_batch_forecast(results, periods):
+    # Only the forecast horizon, one line per series, so series of different scale stay readable
+    fig = go.Figure()
+    for label, result in results.items():
+        future = result["forecast"].tail(periods)
+        fig.add_trace(go.Scatter(x=future["ds"], y=future["yhat"], mode="lines", name=label))
+    fig.update_layout(height=450, margin=dict(l=20, r=20, t=40, b=20),
+                      xaxis_title="Tanggal", yaxis_title="Prediksi (yhat)")
+    return fig
+
+
+def batch_summary(results, requests):
+    """One row per series: forecast horizon total, daily average, trend and fit time."""
+    rows = []
+    for label, result in results.items():
+        request = requests[label]
+        future = result["forecast"].tail(request.forecast_periods)
+        history = result["forecast"].iloc[:-request.forecast_periods]
+        last_value = history["yhat"].iloc[-1] if not history.empty else future["yhat"].iloc[0]
+        timings = result.get("timings") or {}
+        rows.append({
+            "Seri": label,
+            "Model": ENGINE_LABELS[request.engine],
+            "Total Prediksi": future["yhat"].sum(),
+            "Rata-rata per Hari": future["yhat"].mean(),
+            "Perubahan": future["yhat"].iloc[-1] - last_value,
+            "Waktu (detik)": timings.get("fit", 0) + timings.get("predict", 0),
+        })
+    return pd.DataFrame(rows)
+
+
+def generate_forecasting_insights(df_forecast, periods, data_type):
+    insights = []
+    
+    # Filter forecast to only include future predictions
+    future_forecast = df_forecast.tail(periods)
+
+    if future_forecast.empty:
+        insights.append(f"Tidak ada data forecast {data_type} di masa depan untuk dianalisis.")
+        return insights
+
+    # Get the last historical value for comparison (from the part of df_forecast that's not future)
+    # We assume 'ds' is sorted and the last 'periods' rows are the future.
+    # So the last historical point would be just before the future period starts.
+    if len(df_forecast) > periods:
+        last_historical_value = df_forecast['yhat'].iloc[len(df_forecast) - periods - 1]
+    else:
+        # This case implies df_forecast largely consists of future data or very few historical points.
+        # If there's only future data, we can't compare to historical. Adjust this logic as needed.
+        if len(df_forecast) > 0: # If there's at least one data point
+             last_historical_value = df_forecast['yhat'].iloc[0] # Take the earliest if only future or very few points
+        else:
+            last_historical_value = 0 # Default if no data at all
+
+
+    # Calculate the average forecast for the future days
+    avg_forecast_future = future_forecast['yhat'].mean()
+
+    # Calculate the change from the last historical value to the end of the forecast period
+    final_forecast_value = future_forecast['yhat'].iloc[-1]
+    change = final_forecast_value - last_historical_value
+    
+    # Trend Analysis
+    if change > 0:
+        insights.append(f"{data_type.capitalize()} Anda diperkirakan akan menunjukkan tren meningkat dalam {periods} hari ke depan, dengan estimasi kenaikan sekitar Rp {change:,.0f} dari periode terakhir yang tercatat.")
+    elif change < 0:
+        insights.append(f"{data_type.capitalize()} Anda diperkirakan akan menunjukkan tren menurun dalam {periods} hari ke depan, dengan estimasi penurunan sekitar Rp {abs(change):,.0f} dari periode terakhir yang tercatat.")
+    else:
+        insights.append(f"{data_type.capitalize()} Anda diperkirakan akan cenderung stabil dalam {periods} hari ke depan.")
+
+    # Volatility/Uncertainty Analysis
+    # The range of uncertainty (yhat_upper - yhat_lower)
+    avg_uncertainty_range = (future_forecast['yhat_upper'] - future_forecast['yhat_lower']).mean()
+    if avg_forecast_future != 0: # Avoid division by zero
+        if avg_uncertainty_range < abs(avg_forecast_future) * 0.1: # Example threshold: less than 10% of average forecast
+            insights.append(f"Model menunjukkan tingkat kepercayaan yang tinggi terhadap prediksi ini, dengan rata-rata rentang ketidakpastian sekitar Rp {avg_uncertainty_range:,.0f} per hari.")
+        elif avg_uncertainty_range < abs(avg_forecast_future) * 0.3: # Example threshold: less than 30%
+            insights.append(f"Prediksi memiliki tingkat kepercayaan moderat, dengan rata-rata rentang ketidakpastian sekitar **Rp {avg_uncertainty_range:,.0f} per hari. Fluktuasi kecil mungkin terjadi.")
+        else:
+            insights.append(f"Ada ketidakpastian yang cukup tinggi dalam prediksi ini, dengan rata-rata rentang ketidakpastian sekitar Rp {avg_uncertainty_range:,.0f} per hari. Ini bisa disebabkan oleh data historis yang bervariasi. Pertimbangkan untuk menambahkan lebih banyak data atau memeriksa anomali.")
+    else:
+        insights.append(f"Tidak dapat menganalisis volatilitas karena {data_type} rata-rata yang diperkirakan adalah nol.")
+
+    # Seasonal Analysis (simple check for daily/weekly patterns if present)
+    max_forecast_future = future_forecast['yhat'].max()
+    min_forecast_future = future_forecast['yhat'].min()
+    
+    if avg_forecast_future != 0 and (max_forecast_future - min_forecast_future) > (abs(avg_forecast_future) * 0.2): # If fluctuation is more than 20% of avg
+        insights.append(f"Terdapat indikasi pola musiman dalam {data_type}, dengan fluktuasi antara Rp {min_forecast_future:,.0f} dan Rp {max_forecast_future:,.0f} dalam {periods} hari ke depan. Perhatikan hari-hari atau periode tertentu yang mungkin memiliki {data_type} lebih tinggi atau lebih rendah.")
+    else:
+        insights.append(f"Pola musiman yang signifikan tidak terlalu terlihat dalam periode prediksi ini, menunjukkan {data_type} yang cenderung lebih konsisten dari hari ke hari.")
+
+    return insights
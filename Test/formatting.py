@@ -0,0 +1,28 @@
+import streamlit as st
+
+# --- Format Tampilan ---
+# Format Rupiah dan tanggal dipakai bersama oleh Dashboard, Riwayat dan hasil
+# forecasting. Tabel tidak lagi diubah menjadi string per baris: kolom tetap
+# numerik/datetime (bisa diurutkan) dan formatnya diterapkan browser lewat
+# st.column_config. Frame masukan tidak pernah diubah, jadi frame dari cache
+# bisa langsung ditampilkan.
+DATE_FORMAT = "DD-MM-YYYY"  # moment.js, sama dengan '%d-%m-%Y'
+RUPIAH_FORMAT = "Rp %d"  # sprintf-js, tanpa desimal
+
+
+def rupiah(value):
+    """``1234567`` -> ``"Rp 1.234.567"`` for single values (metrics, captions)."""
+    return f"Rp {value:,.0f}".replace(",", ".")
+
+
+def rupiah_column(label):
+    # Explicit printf format: the same "Rp" prefix in every table, whatever the viewer's locale
+    return st.column_config.NumberColumn(label, format=RUPIAH_FORMAT)
+
+
+def date_column(label):
+    return st.column_config.DateColumn(label, format=DATE_FORMAT)
+
+
+def seconds_column(label):
+    return st.column_config.NumberColumn(label, format="%.2f")
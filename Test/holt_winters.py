@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# --- Holt-Winters Forecaster ---
+# Additive Holt-Winters (damped trend + weekly seasonality) yang hanya memakai
+# NumPy. Dipakai untuk histori pendek/jarang di mana Prophet terlalu mahal;
+# keluarannya berbentuk sama dengan forecast Prophet (ds, yhat, yhat_lower,
+# yhat_upper) sehingga bisa langsung dipakai generate_forecasting_insights.
+SEASON_LENGTH = 7
+DAMPING = 0.98
+INTERVAL_Z = 1.2816  # 80% interval, same width as Prophet's default interval_width
+
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.35, 0.5, 0.7, 0.9])
+BETAS = np.array([0.0, 0.01, 0.05, 0.1, 0.2])
+GAMMAS = np.array([0.0, 0.05, 0.1, 0.2, 0.4])
+
+
+def _initial_state(y, m):
+    if m > 1:
+        level = y[:m].mean()
+        trend = (y[m:2 * m].mean() - level) / m
+        season = y[:m] - level
+    else:
+        level = y[0]
+        trend = y[1] - y[0] if len(y) > 1 else 0.0
+        season = np.zeros(1)
+    return level, trend, season
+
+
+def _smooth(y, m, alpha, beta, gamma):
+    """Run the recursions for every parameter combination at once.
+
+    ``alpha``/``beta``/``gamma`` are equal-length arrays (one entry per
+    candidate); the loop is over time only, so a full grid search costs about
+    as much as a single fit in pure Python.
+    """
+    k, n = len(alpha), len(y)
+    level0, trend0, season0 = _initial_state(y, m)
+    level = np.full(k, level0)
+    trend = np.full(k, trend0)
+    season = np.tile(season0, (k, 1))
+    fitted = np.empty((k, n))
+
+    for t in range(n):
+        s = season[:, t % m]
+        fitted[:, t] = level + DAMPING * trend + s
+        new_level = alpha * (y[t] - s) + (1 - alpha) * (level + DAMPING * trend)
+        trend = beta * (new_level - level) + (1 - beta) * DAMPING * trend
+        season[:, t % m] = gamma * (y[t] - new_level) + (1 - gamma) * s
+        level = new_level
+
+    return fitted, level, trend, season
+
+
+def forecast(df_for_forecast, periods):
+    """Fit on a ``ds``/``y`` frame and forecast ``periods`` days ahead."""
+    # Transactions are daily totals: days without a transaction are real zeros
+    history = (df_for_forecast.set_index("ds")["y"]
+               .resample("D").sum()
+               .astype(float))
+    y = history.to_numpy()
+    n = len(y)
+    m = SEASON_LENGTH if n >= 2 * SEASON_LENGTH else 1
+
+    gammas = GAMMAS if m > 1 else np.array([0.0])
+    alpha, beta, gamma = (grid.ravel() for grid in np.meshgrid(ALPHAS, BETAS, gammas, indexing="ij"))
+    fitted, level, trend, season = _smooth(y, m, alpha, beta, gamma)
+
+    # Skip the warm-up season when scoring so the initial state does not dominate
+    warmup = min(m, n - 1)
+    sse = ((fitted[:, warmup:] - y[warmup:]) ** 2).sum(axis=1)
+    best = int(np.argmin(sse))
+    a, b, g = alpha[best], beta[best], gamma[best]
+
+    residuals = y[warmup:] - fitted[best, warmup:]
+    sigma = float(np.sqrt(np.mean(residuals ** 2))) if len(residuals) else 0.0
+
+    h = np.arange(1, periods + 1)
+    damped_sum = np.cumsum(DAMPING ** h)
+    future_season = season[best, (n + h - 1) % m]
+    yhat_future = level[best] + damped_sum * trend[best] + future_season
+
+    # h-step variance for additive damped Holt-Winters: sigma^2 * (1 + sum c_j^2)
+    j = np.arange(1, periods)
+    c = a * (1 + b * DAMPING * (1 - DAMPING ** j) / (1 - DAMPING)) + g * ((j % m) == 0)
+    variance_factor = 1 + np.concatenate([[0.0], np.cumsum(c ** 2)])
+    spread_future = INTERVAL_Z * sigma * np.sqrt(variance_factor)
+
+    future_ds = pd.date_range(history.index[-1] + pd.Timedelta(days=1), periods=periods, freq="D")
+    yhat = np.concatenate([fitted[best], yhat_future])
+    spread = np.concatenate([np.full(n, INTERVAL_Z * sigma), spread_future])
+    return pd.DataFrame({
+        "ds": history.index.append(future_ds),
+        "yhat": yhat,
+        "yhat_lower": yhat - spread,
+        "yhat_upper": yhat + spread,
+    })
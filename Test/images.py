@@ -0,0 +1,87 @@
+import base64
+import hashlib
+import io
+
+import streamlit as st
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+# --- Avatar Pipeline ---
+# Foto profil dinormalisasi saat upload (orientasi EXIF diterapkan lalu metadata
+# dibuang), dipotong persegi dan disimpan dalam ukuran tampilnya saja.
+AVATAR_SIZE_SMALL = 50    # salam di Home
+AVATAR_SIZE_LARGE = 200   # halaman Akun
+
+AVATAR_FORMAT = "WEBP" if features.check("webp") else "PNG"
+RECEIPT_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def _open_normalized(raw_bytes):
+    try:
+        img = Image.open(io.BytesIO(raw_bytes))
+        img.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImageError("File bukan gambar yang valid.") from e
+    # Apply the camera orientation, then re-encode so no EXIF (GPS etc.) survives
+    img = ImageOps.exif_transpose(img)
+    return img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+
+
+def _encode(img):
+    buffer = io.BytesIO()
+    if AVATAR_FORMAT == "WEBP":
+        img.save(buffer, format="WEBP", quality=85, method=4)
+    else:
+        img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def process_avatar(raw_bytes):
+    """Return ``(small_bytes, large_bytes, content_hash)`` for an uploaded photo."""
+    img = _open_normalized(raw_bytes)
+    large = _encode(ImageOps.fit(img, (AVATAR_SIZE_LARGE, AVATAR_SIZE_LARGE), Image.LANCZOS))
+    small = _encode(ImageOps.fit(img, (AVATAR_SIZE_SMALL, AVATAR_SIZE_SMALL), Image.LANCZOS))
+    return small, large, hashlib.sha256(large).hexdigest()
+
+
+def image_mime(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    return "image/png"
+
+
+def to_data_uri(data):
+    return f"data:{image_mime(data)};base64,{base64.b64encode(data).decode()}"
+
+
+@st.cache_resource(max_entries=512, show_spinner=False)
+def avatar_data_uri(content_hash, size, _loader):
+    # Keyed by content hash + size only; _loader fetches the BLOB on a cache miss
+    data = _loader()
+    return to_data_uri(data) if data else None
+
+
+# --- Receipt Ingest ---
+# Bukti transaksi diperkecil ke sisi terpanjang RECEIPT_MAX_SIDE dan di-encode
+# ulang tanpa EXIF. Encoding deterministik, sehingga upload yang identik
+# menghasilkan hash yang sama dan cukup disimpan sekali.
+RECEIPT_MAX_SIDE = 1600
+RECEIPT_QUALITY = 80
+
+
+def process_receipt(raw_bytes):
+    """Return ``(data, content_hash)`` for an uploaded receipt photo."""
+    img = _open_normalized(raw_bytes)
+    img.thumbnail((RECEIPT_MAX_SIDE, RECEIPT_MAX_SIDE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if RECEIPT_FORMAT == "WEBP":
+        img.save(buffer, format="WEBP", quality=RECEIPT_QUALITY, method=4)
+    else:
+        img.convert("RGB").save(buffer, format="JPEG", quality=RECEIPT_QUALITY, optimize=True)
+    data = buffer.getvalue()
+    return data, hashlib.sha256(data).hexdigest()
@@ -0,0 +1,232 @@
+import csv
+import io
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import dates
+import queries
+from database import transaction
+
+# --- Import Massal ---
+# File CSV/XLSX dibaca per potongan (chunk), divalidasi dengan aturan yang sama
+# seperti form input di Home, lalu ditulis dengan executemany dalam satu
+# transaksi per chunk. Baris yang ditolak dikumpulkan beserta alasannya.
+CHUNK_SIZE = 5000
+REQUIRED_COLUMNS = ["tanggal", "jenis", "kategori", "jumlah"]
+OPTIONAL_COLUMNS = ["keterangan"]
+# Accepted after ISO 8601 (YYYY-MM-DD), tried in this order
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y"]
+# Up to 15 digits parses exactly even through float64 (a chunk with blanks) and
+# jumlah * emergency_rate stays far inside int64
+MAX_JUMLAH_DIGITS = 15
+
+# (jenis, kategori lowercase) -> kategori as written by the form
+_KATEGORI_LOOKUP = {
+    f"{jenis}|{kategori.lower()}": kategori
+    for jenis, options in queries.KATEGORI_OPTIONS.items()
+    for kategori in options
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def template_csv():
+    # Header plus one example row per jenis, for the download button
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+    writer.writerow([date.today().isoformat(), "Pendapatan", "Keuntungan", "1500000", "Penjualan harian"])
+    writer.writerow([date.today().isoformat(), "Pengeluaran", "Listrik", "250.000", "Token listrik"])
+    return buffer.getvalue().encode()
+
+
+def _check_columns(columns):
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ImportFormatError(f"Kolom wajib tidak ditemukan: {', '.join(missing)}. "
+                                f"Kolom yang dibutuhkan: {', '.join(REQUIRED_COLUMNS)}.")
+
+
+def _normalize_header(header):
+    return [str(column).strip().lower() if column is not None else "" for column in header]
+
+
+def _sniff_delimiter(data):
+    # Excel with an Indonesian locale saves CSV with ';'
+    first_line = data[:4096].split(b"\n", 1)[0].decode("utf-8-sig", errors="ignore")
+    try:
+        return csv.Sniffer().sniff(first_line, delimiters=",;\t").delimiter
+    except csv.Error:
+        return ","
+
+
+def _read_csv_chunks(data, chunk_size):
+    reader = pd.read_csv(io.BytesIO(data), sep=_sniff_delimiter(data), dtype=str, keep_default_na=False,
+                         chunksize=chunk_size, skipinitialspace=True, encoding="utf-8-sig")
+    for chunk in reader:
+        chunk.columns = _normalize_header(chunk.columns)
+        _check_columns(chunk.columns)
+        yield chunk
+
+
+def _excel_cell(value):
+    # Normalize cells to the strings a CSV export would contain
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _read_xlsx_chunks(data, chunk_size):
+    # Optional dependency: only needed for Excel uploads
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalize_header(next(rows, ()))
+        _check_columns(header)
+        start = 0
+        batch = []
+        padding = [""] * len(header)
+        for row in rows:
+            cells = [_excel_cell(value) for value in row[:len(header)]]
+            batch.append(cells + padding[len(cells):])
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header, index=pd.RangeIndex(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, index=pd.RangeIndex(start, start + len(batch)))
+    finally:
+        workbook.close()
+
+
+def estimate_rows(data, filename):
+    """Row count for the progress bar (CSV: line count, XLSX: sheet dimension)."""
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(io.BytesIO(data), read_only=True)
+        try:
+            return max((workbook.active.max_row or 1) - 1, 1)
+        finally:
+            workbook.close()
+    return max(data.count(b"\n") - 1, 1)
+
+
+def read_chunks(data, filename, chunk_size=CHUNK_SIZE):
+    """Yield DataFrames of string cells with lowercase column names; the index is the 0-based data row."""
+    if filename.lower().endswith(".xlsx"):
+        return _read_xlsx_chunks(data, chunk_size)
+    if filename.lower().endswith(".csv"):
+        return _read_csv_chunks(data, chunk_size)
+    raise ImportFormatError("Format file tidak didukung. Gunakan .csv atau .xlsx.")
+
+
+def _parse_dates(raw):
+    parsed = pd.to_datetime(raw, format="ISO8601", errors="coerce")
+    for date_format in DATE_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(raw[missing], format=date_format, errors="coerce")
+    return parsed
+
+
+def validate_chunk(chunk, emergency_rate):
+    """Split a chunk into insertable rows and rejected rows (with the spreadsheet row number and reason).
+
+    Same rules as the Home form: jenis/kategori from ``queries.KATEGORI_OPTIONS``,
+    jumlah is a positive integer of at most ``MAX_JUMLAH_DIGITS`` digits, written
+    with or without thousand separators, and ``dana_darurat`` is
+    ``emergency_rate`` percent of every pendapatan.
+    """
+    text = chunk.reindex(columns=REQUIRED_COLUMNS + OPTIONAL_COLUMNS, fill_value="").fillna("").astype(str)
+
+    tanggal = _parse_dates(text["tanggal"].str.strip())
+    jenis = text["jenis"].str.strip().str.lower()
+    kategori = (jenis + "|" + text["kategori"].str.strip().str.lower()).map(_KATEGORI_LOOKUP)
+    jumlah_text = text["jumlah"].str.replace(r"^\s*Rp\.?\s*", "", regex=True).str.replace(r"[.,\s]", "", regex=True)
+    jumlah_in_range = jumlah_text.str.fullmatch(rf"0*[1-9]\d{{0,{MAX_JUMLAH_DIGITS - 1}}}")
+    # Out-of-range text never reaches to_numeric, so nothing can wrap around in astype below
+    jumlah = pd.to_numeric(jumlah_text.where(jumlah_in_range, None), errors="coerce")
+
+    conditions = [
+        tanggal.isna(),
+        ~jenis.isin(list(queries.KATEGORI_OPTIONS)),
+        kategori.isna(),
+        ~jumlah_text.str.fullmatch(r"-?\d+"),
+        jumlah.isna(),
+    ]
+    reasons = [
+        "Tanggal tidak valid (gunakan YYYY-MM-DD atau DD-MM-YYYY)",
+        "Jenis harus Pendapatan atau Pengeluaran",
+        "Kategori tidak sesuai dengan jenis",
+        "Jumlah harus berupa angka bulat",
+        f"Jumlah harus lebih dari 0 dan maksimal {MAX_JUMLAH_DIGITS} digit",
+    ]
+    reason = pd.Series(np.select(conditions, reasons, default=""), index=chunk.index)
+    rejected_mask = reason != ""
+
+    valid = pd.DataFrame({
+        "tanggal": tanggal,
+        "kategori": kategori,
+        "jenis": jenis,
+        "jumlah": jumlah,
+        "keterangan": text["keterangan"].str.strip(),
+    })[~rejected_mask]
+    valid["jumlah"] = valid["jumlah"].astype("int64")
+    valid["tanggal"] = dates.datetime_to_epoch_days(valid["tanggal"])
+    valid["dana_darurat"] = np.where(valid["jenis"] == "pendapatan", valid["jumlah"] * emergency_rate // 100, 0)
+
+    rejected = chunk[rejected_mask].copy()
+    rejected.insert(0, "baris", chunk.index[rejected_mask] + 2)  # +1 header, +1 one-based
+    rejected.insert(1, "alasan", reason[rejected_mask])
+    return valid, rejected
+
+
+def insert_rows(user_id, valid):
+    """Insert one validated chunk in a single transaction; returns the number of rows written."""
+    rows = zip(
+        [user_id] * len(valid),
+        valid["tanggal"].tolist(), valid["kategori"], valid["jenis"],
+        valid["jumlah"].tolist(), valid["dana_darurat"].tolist(), valid["keterangan"],
+    )
+    with transaction() as conn:
+        conn.executemany("""
+            INSERT INTO laporan_keuangan (user_id, tanggal, kategori, jenis, jumlah, dana_darurat, keterangan)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    return len(valid)
+
+
+def import_file(user_id, data, filename, emergency_rate, on_progress=None, chunk_size=CHUNK_SIZE):
+    """Validate and insert ``data`` chunk by chunk; returns ``(inserted, rejected_df)``.
+
+    ``on_progress(rows_done)`` is called after every chunk. Chunks already
+    committed stay committed if a later chunk fails to parse.
+    """
+    inserted = 0
+    processed = 0
+    rejected = []
+    for chunk in read_chunks(data, filename, chunk_size):
+        valid, chunk_rejected = validate_chunk(chunk, emergency_rate)
+        if not valid.empty:
+            inserted += insert_rows(user_id, valid)
+        if not chunk_rejected.empty:
+            rejected.append(chunk_rejected)
+        processed += len(chunk)
+        if on_progress is not None:
+            on_progress(processed)
+    rejected_df = pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame(columns=["baris", "alasan"])
+    return inserted, rejected_df
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+import pandas as pd
+
+import dates
+from database import connection
+
+# Kolom yang dibutuhkan setiap halaman. Bukti gambar tidak pernah ikut dimuat
+# ke DataFrame; gambar hanya dibaca lewat receipts.fetch_receipt().
+RIWAYAT_COLUMNS = ["id", "tanggal", "jenis", "kategori", "jumlah", "dana_darurat", "keterangan"]
+RIWAYAT_PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_RIWAYAT_PAGE_SIZE = 50
+
+# Pilihan kategori per jenis, sama dengan form input di Home dan Edit Transaksi
+KATEGORI_OPTIONS = {
+    "pendapatan": ["Keuntungan"],
+    "pengeluaran": ["Listrik", "Gaji", "PDAM", "Bahan Baku", "Sewa Tempat", "Lain-lain"],
+}
+
+
+def get_transaction(user_id, transaction_id):
+    # Satu baris tanpa BLOB; bukti_hash adalah kunci gambar di tabel receipts
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT id, tanggal, kategori, jenis, jumlah, dana_darurat, keterangan,
+                   bukti_hash
+            FROM laporan_keuangan WHERE id = ? AND user_id = ?
+        """, (transaction_id, user_id)).fetchone()
+    if row is None:
+        return None
+    columns = ["id", "tanggal", "kategori", "jenis", "jumlah", "dana_darurat", "keterangan", "bukti_hash"]
+    entry = dict(zip(columns, row))
+    entry["tanggal"] = dates.from_epoch_days(entry["tanggal"])
+    return entry
+
+
+# --- Agregasi Dashboard ---
+# SQLite sudah menjumlahkan transaksi ke tabel rollup daily_summary (lihat
+# database.py). Rollup per user dimuat sekali per generation data lewat
+# cache.py; perubahan filter Dashboard hanya memotong frame kecil itu di memori.
+
+@dataclass(frozen=True)
+class LedgerFilter:
+    jenis: Optional[str] = None    # "pendapatan" / "pengeluaran"
+    kategori: Optional[str] = None
+    start: Optional[date] = None   # inklusif
+    end: Optional[date] = None     # inklusif
+    month: Optional[int] = None    # 1-12, di semua tahun
+    year: Optional[int] = None
+    # Tahun (awal, akhir) yang dicakup data user: filter bulan tanpa tahun
+    # dipecah menjadi satu rentang tanggal per tahun untuk SQL
+    years: Optional[tuple] = None
+
+    def apply(self, rollup_df):
+        mask = pd.Series(True, index=rollup_df.index)
+        if self.jenis:
+            mask &= rollup_df["jenis"] == self.jenis
+        if self.kategori:
+            mask &= rollup_df["kategori"] == self.kategori
+        if self.start:
+            mask &= rollup_df["tanggal"] >= pd.Timestamp(self.start)
+        if self.end:
+            mask &= rollup_df["tanggal"] <= pd.Timestamp(self.end)
+        if self.month:
+            mask &= rollup_df["tanggal"].dt.month == self.month
+        if self.year:
+            mask &= (rollup_df["tanggal"] >= pd.Timestamp(self.year, 1, 1)) & (rollup_df["tanggal"] < pd.Timestamp(self.year + 1, 1, 1))
+        return rollup_df[mask]
+
+    def where_clause(self):
+        """The same filter as SQL predicates on ``laporan_keuangan``; every date filter is an epoch-day range."""
+        clauses, params = [], []
+        if self.jenis:
+            clauses.append("jenis = ?")
+            params.append(self.jenis)
+        if self.kategori:
+            clauses.append("kategori = ?")
+            params.append(self.kategori)
+        if self.start:
+            clauses.append("tanggal >= ?")
+            params.append(dates.to_epoch_days(self.start))
+        if self.end:
+            clauses.append("tanggal <= ?")
+            params.append(dates.to_epoch_days(self.end))
+        if self.month and (self.year or self.years):
+            first_year, last_year = (self.year, self.year) if self.year else self.years
+            ranges = [dates.month_range(year, self.month) for year in range(first_year, last_year + 1)]
+            clauses.append("(" + " OR ".join(["(tanggal >= ? AND tanggal < ?)"] * len(ranges)) + ")")
+            params.extend(bound for month_range in ranges for bound in month_range)
+        elif self.month:
+            # Without the year span the month has to be computed per row
+            clauses.append("CAST(strftime('%m', tanggal * 86400, 'unixepoch') AS INTEGER) = ?")
+            params.append(self.month)
+        if self.year:
+            clauses.append("tanggal >= ? AND tanggal < ?")
+            params.extend(dates.year_range(self.year))
+        return " AND ".join(clauses) or "1", params
+
+
+def load_riwayat_page(user_id, ledger_filter, page_size, after=None):
+    """One Riwayat page, newest first, keyset-paginated on ``(tanggal, id)``.
+
+    ``after`` is the ``(tanggal, id)`` key of the last row of the previous page.
+    Returns ``(page_df, next_key)``; ``next_key`` is None on the last page.
+    """
+    where, params = ledger_filter.where_clause()
+    if after is not None:
+        where += " AND (tanggal, id) < (?, ?)"
+        params.extend(after)
+    with connection() as conn:
+        df = pd.read_sql_query(f"""
+            SELECT {', '.join(RIWAYAT_COLUMNS)} FROM laporan_keuangan
+            WHERE user_id = ? AND {where}
+            ORDER BY tanggal DESC, id DESC
+            LIMIT ?
+        """, conn, params=(user_id, *params, page_size + 1))
+
+    next_key = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        next_key = (int(df["tanggal"].iloc[-1]), int(df["id"].iloc[-1]))
+    df["tanggal"] = dates.epoch_days_to_datetime(df["tanggal"])
+    return df, next_key
+
+
+def load_daily_summary(user_id):
+    with connection() as conn:
+        df = pd.read_sql_query("""
+            SELECT tanggal, jenis, kategori, total AS jumlah, count, dana_darurat
+            FROM daily_summary WHERE user_id = ? ORDER BY tanggal
+        """, conn, params=(user_id,))
+    df["tanggal"] = dates.epoch_days_to_datetime(df["tanggal"])
+    return df
+
+
+def distinct_kategori(rollup_df):
+    return sorted(k for k in rollup_df["kategori"].unique() if k)
+
+
+def available_months(rollup_df):
+    return sorted(rollup_df["tanggal"].dt.month.unique())
+
+
+def available_years(rollup_df):
+    return sorted(rollup_df["tanggal"].dt.year.unique())
+
+
+def summarize(rollup_df):
+    totals = rollup_df.groupby("jenis")["jumlah"].sum()
+    return {
+        "count": int(rollup_df["count"].sum()),
+        "total_pendapatan": totals.get("pendapatan", 0),
+        "total_pengeluaran": totals.get("pengeluaran", 0),
+        "first_date": rollup_df["tanggal"].min() if not rollup_df.empty else None,
+        "last_date": rollup_df["tanggal"].max() if not rollup_df.empty else None,
+    }
+
+
+def daily_totals(rollup_df):
+    # Satu baris per (tanggal, jenis): dipakai grafik Tren Harian dan input forecasting
+    return rollup_df.groupby(["tanggal", "jenis"], as_index=False)["jumlah"].sum()
+
+
+def kategori_totals(rollup_df):
+    return rollup_df.groupby("kategori", as_index=False)["jumlah"].sum()
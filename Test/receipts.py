@@ -0,0 +1,26 @@
+import streamlit as st
+
+import images
+from database import connection, insert_receipt
+
+# --- Receipt Store ---
+# Bukti gambar disimpan sekali per isi di tabel receipts (kunci SHA-256);
+# laporan_keuangan hanya menyimpan bukti_hash. Karena kuncinya adalah isi
+# gambar itu sendiri, cache fetch_receipt tidak pernah perlu diinvalidasi.
+
+
+def prepare_receipt(raw_bytes):
+    # Pillow work happens before the write transaction, not while holding the lock
+    return images.process_receipt(raw_bytes)
+
+
+def save_receipt(conn, content_hash, data):
+    insert_receipt(conn.cursor(), content_hash, data)
+    return content_hash
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def fetch_receipt(content_hash):
+    with connection() as conn:
+        row = conn.execute("SELECT data FROM receipts WHERE hash = ?", (content_hash,)).fetchone()
+    return row[0] if row else None
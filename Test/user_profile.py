@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import streamlit as st
+
+from database import connection
+
+# --- Profil User per Sesi ---
+# Nama akun, persentase dana darurat dan hash foto profil dibaca sekali setelah
+# login lalu disimpan di session state. Setiap halaman memakai objek ini, jadi
+# tabel users hanya di-query lagi setelah profil diubah (invalidate_profile).
+# BLOB foto tidak ikut dimuat: avatar_uri membacanya hanya saat cache gambar miss.
+SESSION_KEY = "user_profile"
+DEFAULT_EMERGENCY_RATE = 5
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    user_id: int
+    username: str
+    nama_akun: Optional[str]
+    emergency_rate: int
+    profile_pic_hash: Optional[str]
+
+    @property
+    def display_name(self):
+        return self.nama_akun or self.username
+
+
+def load_profile(user_id):
+    with connection() as conn:
+        row = conn.execute("SELECT username, nama_akun, emergency_rate, profile_pic_hash FROM users WHERE user_id = ?",
+                           (user_id,)).fetchone()
+    username, nama_akun, emergency_rate, profile_pic_hash = row if row else ("", None, None, None)
+    return UserProfile(
+        user_id=user_id,
+        username=username,
+        nama_akun=nama_akun,
+        emergency_rate=emergency_rate if emergency_rate is not None else DEFAULT_EMERGENCY_RATE,
+        profile_pic_hash=profile_pic_hash,
+    )
+
+
+def get_profile():
+    """Profile of the logged-in user, loaded on first use after login or after ``invalidate_profile``."""
+    user_id = st.session_state["user_id"]
+    profile = st.session_state.get(SESSION_KEY)
+    if profile is None or profile.user_id != user_id:
+        profile = load_profile(user_id)
+        st.session_state[SESSION_KEY] = profile
+    return profile
+
+
+def invalidate_profile():
+    # Call after every write to the users row of the logged-in user (and on login/logout)
+    st.session_state.pop(SESSION_KEY, None)